@@ -0,0 +1,143 @@
+import math
+import time
+
+from jose import JWTError, jwt
+from starlette.responses import JSONResponse
+
+from .cache import TTLCache
+from .config import settings
+from .database import READ_METHODS, engines, pool_stats
+from .metrics import REQUESTS_REJECTED
+
+# Served without touching the database, or needed to observe an overloaded
+# worker; never limited or shed.
+EXEMPT_PATHS = ("/health/", "/metrics", settings.MEDIA_URL + "/")
+LOGIN_ROUTES = {("POST", "/login"), ("POST", "/users/")}
+
+SHED_RETRY_AFTER_SECONDS = 1
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, tokens: float, updated_at: float):
+        self.tokens = tokens
+        self.updated_at = updated_at
+
+
+class Budget:
+    """A token bucket per client: ``burst`` requests at once, refilled at
+    ``per_minute`` requests a minute.
+
+    Buckets live in the worker, so with several workers a client may get up
+    to this budget from each of them.
+    """
+
+    def __init__(self, name: str, per_minute: int, burst: int):
+        self.name = name
+        self.rate = per_minute / 60
+        self.burst = burst
+        # An idle bucket is full again after burst / rate seconds, so it can
+        # be dropped then and recreated full.
+        self._buckets = TTLCache(maxsize=settings.RATE_LIMIT_MAX_CLIENTS, ttl=burst / self.rate)
+
+    def take(self, key: str) -> float:
+        # Returns 0 when the request is allowed, otherwise the seconds until
+        # the client has a token again.
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated_at) * self.rate)
+            bucket.updated_at = now
+        self._buckets.set(key, bucket)
+        if bucket.tokens < 1:
+            return (1 - bucket.tokens) / self.rate
+        bucket.tokens -= 1
+        return 0
+
+
+def db_in_flight() -> int:
+    # Connections in use plus checkouts queued for one.
+    return sum(target.sync_engine.pool.checkedout() for target in engines) + pool_stats.waiting
+
+
+def client_address(scope) -> str:
+    # Behind a proxy this is the X-Forwarded-For address, when uvicorn
+    # trusts the proxy (FORWARDED_ALLOW_IPS).
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def client_key(scope) -> str:
+    # Authenticated clients are limited per user, whatever address they
+    # come from; the token is only checked for its signature here, the
+    # route still validates it.
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer":
+                try:
+                    subject = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]).get("sub")
+                except JWTError:
+                    break
+                if subject:
+                    return f"user:{subject}"
+            break
+    return f"ip:{client_address(scope)}"
+
+
+def rejection(status_code: int, detail: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AdmissionMiddleware:
+    # Refuses work the worker cannot take on fast, instead of letting it
+    # queue for a database connection until checkouts time out: 503 while
+    # too much database work is in flight, 429 for clients over their budget.
+    def __init__(self, app):
+        self.app = app
+        self.max_db_in_flight = settings.ADMISSION_MAX_DB_IN_FLIGHT or 2 * len(engines) * (
+            settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW
+        )
+        self.budgets = {}
+        if settings.RATE_LIMIT_ENABLED:
+            self.budgets = {
+                "login": Budget("login", settings.RATE_LIMIT_LOGIN_PER_MINUTE, settings.RATE_LIMIT_LOGIN_BURST),
+                "write": Budget("write", settings.RATE_LIMIT_WRITE_PER_MINUTE, settings.RATE_LIMIT_WRITE_BURST),
+                "read": Budget("read", settings.RATE_LIMIT_READ_PER_MINUTE, settings.RATE_LIMIT_READ_BURST),
+            }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"].startswith(EXEMPT_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        if db_in_flight() >= self.max_db_in_flight:
+            REQUESTS_REJECTED.labels("overloaded").inc()
+            response = rejection(503, "Server is overloaded, retry later", SHED_RETRY_AFTER_SECONDS)
+            await response(scope, receive, send)
+            return
+
+        if self.budgets:
+            method = scope["method"]
+            if (method, scope["path"]) in LOGIN_ROUTES:
+                # Password guessing is limited per address, not per account.
+                budget = self.budgets["login"]
+                key = f"ip:{client_address(scope)}"
+            else:
+                budget = self.budgets["read" if method in READ_METHODS else "write"]
+                key = client_key(scope)
+            retry_after = budget.take(key)
+            if retry_after:
+                REQUESTS_REJECTED.labels(f"rate_limit_{budget.name}").inc()
+                response = rejection(429, "Too many requests", retry_after)
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
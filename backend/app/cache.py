@@ -0,0 +1,78 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, NamedTuple
+
+from fastapi import Request, Response, status
+
+
+class TTLCache:
+    """In-process LRU cache whose entries expire ``ttl`` seconds after being set.
+
+    Each worker process holds its own copy, so entries may be stale in other
+    workers for up to ``ttl`` seconds after an invalidation.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CachedBody(NamedTuple):
+    body: bytes
+    etag: str
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+async def cached_json_response(
+        request: Request,
+        cache: TTLCache,
+        render: Callable[[], Awaitable[bytes]],
+    ) -> Response:
+    # Bodies are cached already serialized, keyed by path and query string,
+    # with a strong ETag over the exact bytes. A hit costs no query and no
+    # JSON encoding; a matching If-None-Match costs no body either.
+    key = (request.url.path, request.url.query)
+    entry = cache.get(key)
+    if entry is None:
+        body = await render()
+        entry = CachedBody(body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+        cache.set(key, entry)
+
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
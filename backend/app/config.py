@@ -1,4 +1,4 @@
-from typing import List, Literal
+from typing import List, Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -14,6 +14,30 @@ class Settings(BaseSettings):
     def DATABASE_URL(self):
         return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
+    # Optional streaming replica for GET and HEAD requests; same credentials
+    # and database name as the primary.
+    POSTGRES_REPLICA_HOST: Optional[str] = None
+    POSTGRES_REPLICA_PORT: Optional[str] = None
+
+    @property
+    def DATABASE_REPLICA_URL(self):
+        if not self.POSTGRES_REPLICA_HOST:
+            return None
+        port = self.POSTGRES_REPLICA_PORT or self.POSTGRES_PORT
+        return f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_REPLICA_HOST}:{port}/{self.POSTGRES_DB}"
+
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Connections all workers may open on the primary; sizes the default
+    # gunicorn worker count.
+    DB_CONNECTION_BUDGET: int = 90
+    # asyncpg prepared statement cache per connection; 0 behind pgbouncer
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
     CORS_ORIGINS: List[str]
     CORS_HEADERS: List[str]
     CORS_METHODS: List[str]
@@ -22,6 +46,34 @@ class Settings(BaseSettings):
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
 
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 60
+
+    # Token buckets per user, or per address before login; per worker.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_MAX_CLIENTS: int = 100000
+    RATE_LIMIT_LOGIN_PER_MINUTE: int = 10
+    RATE_LIMIT_LOGIN_BURST: int = 5
+    RATE_LIMIT_WRITE_PER_MINUTE: int = 60
+    RATE_LIMIT_WRITE_BURST: int = 20
+    RATE_LIMIT_READ_PER_MINUTE: int = 600
+    RATE_LIMIT_READ_BURST: int = 100
+    # Requests get a 503 while this many connections are checked out or
+    # awaited; by default twice the pool capacity.
+    ADMISSION_MAX_DB_IN_FLIGHT: Optional[int] = None
+
+    GZIP_MINIMUM_SIZE: int = 1000
+    GZIP_COMPRESS_LEVEL: int = 6
+
+    MEDIA_ROOT: str = "media"
+    MEDIA_URL: str = "/media"
+    MAX_IMAGE_BYTES: int = 10 * 1024 * 1024
+    IMAGE_WORKERS: int = 2
+    IMAGE_VARIANT_WIDTHS: List[int] = [320, 1024]
+
     model_config = SettingsConfigDict(env_file=".env", extra="allow")
 
 
@@ -1,8 +1,13 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import declared_attr, Mapped, mapped_column, DeclarativeBase
-from sqlalchemy.ext.asyncio import async_sessionmaker, async_scoped_session
-from asyncio import current_task
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import exc, text
+from fastapi import Request
+from typing import AsyncIterator
+import asyncio
+import time
 from .config import settings
 
 
@@ -15,7 +20,89 @@ class Base(DeclarativeBase):
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+
+class PoolStats:
+    def __init__(self):
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    # Times every checkout, including the wait for a free connection when the
+    # pool and its overflow are exhausted. Stats live outside the instance
+    # because the engine replaces its pool on dispose(); with a replica they
+    # cover both engines.
+    def connect(self):
+        pool_stats.waiting += 1
+        started_at = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            pool_stats.checkout_timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started_at
+            pool_stats.waiting -= 1
+            pool_stats.checkouts += 1
+            pool_stats.wait_seconds_total += waited
+            pool_stats.wait_seconds_max = max(pool_stats.wait_seconds_max, waited)
+
+
+def make_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        echo=settings.DB_ECHO,
+        poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE},
+    )
+
+
+engine = make_engine(settings.DATABASE_URL)
+# Serves GET and HEAD requests; the primary itself when no replica is set.
+read_engine = make_engine(settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else engine
+engines = [engine] if read_engine is engine else [engine, read_engine]
+
+
+async def warm_up_pool() -> None:
+    # Open pool_size connections at once so the first requests after a
+    # (re)start do not pay for TCP, auth and asyncpg type introspection.
+    async def ping(target: AsyncEngine):
+        async with target.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(ping(target) for target in engines for _ in range(settings.DB_POOL_SIZE)))
+
+
+async def dispose_engines() -> None:
+    for target in engines:
+        await target.dispose()
+
+
+def get_pool_status() -> dict:
+    pool = engine.sync_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "waiting": pool_stats.waiting,
+        "checkouts": pool_stats.checkouts,
+        "checkout_timeouts": pool_stats.checkout_timeouts,
+        "wait_seconds_total": pool_stats.wait_seconds_total,
+        "wait_seconds_max": pool_stats.wait_seconds_max,
+    }
 
 async_session_maker = async_sessionmaker(
     engine,
@@ -23,24 +110,79 @@ async_session_maker = async_sessionmaker(
     class_=AsyncSession  
 )
 
-async def get_db():
-    async with async_session_maker() as session:
-        yield session
-        await session.close()
+read_session_maker = async_sessionmaker(
+    read_engine,
+    expire_on_commit=False,
+    class_=AsyncSession
+)
+
+READ_METHODS = frozenset({"GET", "HEAD"})
 
-def get_scoped_session():
-    session = async_scoped_session(
-        session_factory=async_session_maker,
-        scopefunc=current_task,
-    )
-    return session
 
-async def session_dependency() -> AsyncSession:  # type: ignore
-    async with async_session_maker() as session:
-        yield session
-        await session.close()
+class ReplicaFence:
+    """Keeps the replica from filling response caches before it has replayed
+    the write that cleared them, which would cache the old body for the
+    whole TTL.
+
+    A cleared cache marks the fence; the next fill looks up the primary's
+    WAL position, and fills go to the primary until the replica has
+    replayed up to it.
+    """
+
+    def __init__(self):
+        self._written = False
+        self._lsn = None
+
+    def written(self) -> None:
+        # Called once the write is committed, so the primary's position
+        # looked up afterwards is past its commit record.
+        self._written = True
+
+    async def passed(self) -> bool:
+        if read_engine is engine:
+            return True
+        if self._written:
+            self._written = False
+            async with engine.connect() as connection:
+                lsn = await connection.scalar(text("SELECT pg_current_wal_lsn() - '0/0'"))
+            self._lsn = lsn if self._lsn is None else max(self._lsn, lsn)
+        if self._lsn is None:
+            return True
+        async with read_engine.connect() as connection:
+            # NULL when the "replica" is not in recovery, i.e. a primary.
+            replayed = await connection.scalar(text("SELECT pg_last_wal_replay_lsn() - '0/0'"))
+        # Another write may have moved the fence while this one waited.
+        if self._lsn is not None and (replayed is None or replayed >= self._lsn):
+            self._lsn = None
+        return self._lsn is None and not self._written
+
+
+replica_fence = ReplicaFence()
+
+
+async def get_session(request: Request) -> AsyncIterator[AsyncSession]:
+    # One session per request, shared by every dependency that asks for it.
+    # crud functions commit their own writes; anything still uncommitted
+    # when the request ends, after an error included, is rolled back.
+    # GET and HEAD requests read from the replica when one is configured,
+    # so they may trail a just-committed write by the replication lag;
+    # routes whose responses are cached use get_cached_read_session.
+    session_maker = read_session_maker if request.method in READ_METHODS else async_session_maker
+    async with session_maker() as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+
 
-async def scoped_session_dependency() -> AsyncSession:  # type: ignore
-    session = get_scoped_session()
-    yield session
-    await session.close()
\ No newline at end of file
+async def get_cached_read_session() -> AsyncIterator[AsyncSession]:
+    # For GET routes that fill the in-process response caches: the replica,
+    # or the primary while the replica is behind the last write.
+    session_maker = read_session_maker if await replica_fence.passed() else async_session_maker
+    async with session_maker() as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
@@ -1,11 +1,56 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import FastAPI, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST
 
 from app.users import routers as users_routers
 from app.posts import routers as posts_routers
+from .admission import AdmissionMiddleware
 from .config import settings
+from .database import dispose_engines, get_pool_status, warm_up_pool
+from .media import ImmutableStaticFiles, shutdown_image_pool
+from .metrics import MetricsMiddleware, render_metrics
+from .pubsub import pubsub
+from .users.revocation import load_denylist
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_RETRY_SECONDS = 2
+
+
+async def warm_up(app: FastAPI) -> None:
+    # Retried in the background instead of failing startup, so a database
+    # that comes up late keeps the worker alive but not ready.
+    while True:
+        try:
+            await warm_up_pool()
+            await load_denylist()
+        except Exception:
+            logger.exception("Database warm-up failed, retrying in %ss", WARM_UP_RETRY_SECONDS)
+            await asyncio.sleep(WARM_UP_RETRY_SECONDS)
+        else:
+            app.state.ready = True
+            return
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ready = False
+    warm_up_task = asyncio.create_task(warm_up(app))
+    pubsub_task = asyncio.create_task(pubsub.run())
+    yield
+    warm_up_task.cancel()
+    pubsub_task.cancel()
+    shutdown_image_pool()
+    await dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 
@@ -15,6 +60,26 @@ async def root():
     return {"message": "Hello World"}
 
 
+@app.get("/health/ready")
+async def readiness(response: Response):
+    if not getattr(app.state, "ready", False):
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"ready": False}
+    return {"ready": True}
+
+
+@app.get("/health/db-pool")
+async def db_pool_status():
+    return get_pool_status()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+# Innermost, so rejections still carry CORS headers and are counted.
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ORIGINS,
@@ -22,6 +87,17 @@ app.add_middleware(
     allow_methods=settings.CORS_METHODS,
     allow_headers=settings.CORS_HEADERS,
 )
+# Bodies under GZIP_MINIMUM_SIZE go out as they are: compressing a small
+# JSON document costs more than the bytes it saves.
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=settings.GZIP_MINIMUM_SIZE,
+    compresslevel=settings.GZIP_COMPRESS_LEVEL,
+)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(users_routers.router)
-app.include_router(posts_routers.router)
\ No newline at end of file
+app.include_router(posts_routers.router)
+
+Path(settings.MEDIA_ROOT).mkdir(parents=True, exist_ok=True)
+app.mount(settings.MEDIA_URL, ImmutableStaticFiles(directory=settings.MEDIA_ROOT), name="media")
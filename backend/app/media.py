@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from fastapi.staticfiles import StaticFiles
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .config import settings
+
+IMAGES_DIR = "images"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Uploaded originals are kept as they came; anything else is rejected.
+IMAGE_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def image_path(name: str) -> str:
+    # Two hex characters of fan-out keep directories small.
+    return f"{IMAGES_DIR}/{name[:2]}/{name}"
+
+
+def variant_name(path: str, width: int) -> str:
+    return f"{path.rsplit('.', 1)[0]}_{width}.webp"
+
+
+def image_urls(path: str) -> dict:
+    return {
+        "original": f"{settings.MEDIA_URL}/{path}",
+        **{
+            str(width): f"{settings.MEDIA_URL}/{variant_name(path, width)}"
+            for width in settings.IMAGE_VARIANT_WIDTHS
+        },
+    }
+
+
+def write_file(path: Path, data: bytes) -> None:
+    # Written under a temporary name and renamed, so a reader never sees a
+    # half-written file and concurrent uploads of the same image are harmless.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def store_image(data: bytes, media_root: str, widths: tuple[int, ...]) -> str:
+    # Runs in a worker process: decoding and resizing are CPU-bound and
+    # would otherwise block the event loop. Returns the original's path
+    # relative to media_root.
+    try:
+        with Image.open(BytesIO(data)) as image:
+            image.verify()
+        image = Image.open(BytesIO(data))
+        image_format = image.format
+        image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise InvalidImage("Not a readable image") from e
+    if image_format not in IMAGE_EXTENSIONS:
+        raise InvalidImage(f"Unsupported image format {image_format}")
+
+    path = image_path(f"{hashlib.sha256(data).hexdigest()[:32]}.{IMAGE_EXTENSIONS[image_format]}")
+    root = Path(media_root)
+    original = root / path
+    if original.exists():
+        return path
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+    for width in widths:
+        variant = image.copy()
+        variant.thumbnail((width, width * 4))
+        buffer = BytesIO()
+        variant.save(buffer, "WEBP", quality=80, method=4)
+        write_file(root / variant_name(path, width), buffer.getvalue())
+    # The original goes last: its presence means every variant is there.
+    write_file(original, data)
+    return path
+
+
+_image_pool: ProcessPoolExecutor | None = None
+
+
+def get_image_pool() -> ProcessPoolExecutor:
+    global _image_pool
+    if _image_pool is None:
+        # spawn rather than fork: the parent runs an event loop and threads.
+        _image_pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _image_pool
+
+
+def shutdown_image_pool() -> None:
+    global _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown(cancel_futures=True)
+        _image_pool = None
+
+
+async def save_image(data: bytes) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_image_pool(),
+        store_image,
+        data,
+        settings.MEDIA_ROOT,
+        tuple(settings.IMAGE_VARIANT_WIDTHS),
+    )
+
+
+class ImmutableStaticFiles(StaticFiles):
+    # File names are content hashes, so a URL never changes meaning and
+    # clients may cache it forever.
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
@@ -0,0 +1,147 @@
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+
+from .database import engines, get_pool_status
+from .users.hashing import password_hasher
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route",
+    ["method", "route"],
+)
+REQUESTS = Counter(
+    "http_requests_total",
+    "Requests by route and status code",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Requests currently being served",
+    multiprocess_mode="livesum",
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed per request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds",
+    "Time spent in SQL statements per request",
+    ["method", "route"],
+)
+REQUESTS_REJECTED = Counter(
+    "http_requests_rejected_total",
+    "Requests refused by admission control, by reason",
+    ["reason"],
+)
+DB_STATEMENTS = Counter(
+    "db_statements_total",
+    "SQL statements executed, including those outside requests",
+)
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+_query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def track_queries() -> QueryStats:
+    # SQLAlchemy runs the driver inside a greenlet that shares the caller's
+    # context, so statements executed after this call are counted here.
+    stats = QueryStats()
+    _query_stats.set(stats)
+    return stats
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started_at"].pop()
+    DB_STATEMENTS.inc()
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+
+
+for _engine in engines:
+    event.listen(_engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(_engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = track_queries()
+        REQUESTS_IN_PROGRESS.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            REQUESTS_IN_PROGRESS.dec()
+            # The route template, not the raw path, keeps label cardinality
+            # bounded; unmatched paths (404s) share one label.
+            route = scope.get("route")
+            route_path = getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            REQUEST_LATENCY.labels(method, route_path).observe(elapsed)
+            REQUESTS.labels(method, route_path, str(status_code)).inc()
+            REQUEST_DB_QUERIES.labels(method, route_path).observe(stats.count)
+            REQUEST_DB_SECONDS.labels(method, route_path).observe(stats.seconds)
+
+
+class RuntimeCollector:
+    # Pool and password hasher state is read at scrape time.
+    def collect(self):
+        for key, value in get_pool_status().items():
+            if key in ("checkouts", "checkout_timeouts", "wait_seconds_total"):
+                yield CounterMetricFamily(f"db_pool_{key}", f"Connection pool {key}", value=value)
+            else:
+                yield GaugeMetricFamily(f"db_pool_{key}", f"Connection pool {key}", value=value)
+        for key, value in password_hasher.stats().items():
+            if key in ("completed", "wait_seconds_total", "run_seconds_total"):
+                yield CounterMetricFamily(f"password_hash_{key}", f"Password hasher {key}", value=value)
+            else:
+                yield GaugeMetricFamily(f"password_hash_{key}", f"Password hasher {key}", value=value)
+
+
+REGISTRY.register(RuntimeCollector())
+
+
+def render_metrics() -> bytes:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest()
+    # Under gunicorn every worker writes its samples to the shared directory
+    # and any worker can answer the scrape with the aggregate. Pool and
+    # hasher stats are those of the worker serving the scrape.
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(RuntimeCollector())
+    return generate_latest(registry)
@@ -2,15 +2,61 @@
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import and_, delete, func, or_, tuple_, update
 from sqlalchemy.engine import Result
 from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
+import math
 import json
-from datetime import datetime, date, time
-from typing import List, Optional
-from .schemas import PostBase
-from .models import Post, Category
+from datetime import datetime, date, time, timedelta
+from typing import List, Optional, Sequence
+from .schemas import PostBase, PostFilters, Viewport
+from .models import Post, Category, SEARCH_CONFIG
 from . import schemas, models
-from ..database import scoped_session_dependency
+from ..cache import TTLCache
+from ..database import replica_fence
+from ..pubsub import RESET, publish
+from ..users.models import User
+from ..pagination import PageParams, decode_cursor, encode_cursor
+
+# Grid cells are CLUSTER_CELL_PX wide on a 256px web map tile, so a screen
+# never holds more than a few hundred of them whatever the post density.
+CLUSTER_CELL_PX = 64
+CLUSTER_SAMPLE_SIZE = 3
+
+clusters_cache = TTLCache(maxsize=1024, ttl=60)
+responses_cache = TTLCache(maxsize=256, ttl=30)
+
+
+# NOTIFY channel for post changes; see posts.live.
+POSTS_CHANNEL = "posts"
+
+
+def invalidate_post_caches() -> None:
+    clusters_cache.clear()
+    responses_cache.clear()
+    replica_fence.written()
+
+
+def post_event(event: str, post, previous: dict | None = None) -> dict:
+    return {
+        "event": event,
+        "post": schemas.PostSummary.model_validate(post).model_dump(mode="json"),
+        "previous": previous,
+    }
+
+
+async def check_category(session: AsyncSession, category_id: int | None) -> None:
+    # The key share lock keeps the category from being deleted before the
+    # post that names it is committed.
+    if category_id is None:
+        return
+    stmt = select(Category.id).filter(Category.id == category_id).with_for_update(key_share=True)
+    if await session.scalar(stmt) is None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"category_id: category {category_id} does not exist",
+        )
 
 
 async def create_post(
@@ -18,35 +64,52 @@ async def create_post(
         post: schemas.PostBase,
         current_user_id: int,
     ) -> schemas.PostCreate:
-    post_data = post.dict()
-    post_data["owner"] = current_user_id
-    post_data["date"] = date.fromisoformat(str(post_data["date"]))
-    post_data["time"] = time.fromisoformat(str(post_data["time"]))
-    post = Post(**post_data)
+    await check_category(session, post.category_id)
+    post = Post(**post.model_dump(), owner=current_user_id)
     session.add(post)
+    await session.flush()
+    await publish(session, POSTS_CHANNEL, post_event("created", post))
     await session.commit()
+    invalidate_post_caches()
     return post
 
-async def get_post(session: AsyncSession, post_id: int) -> dict | None:
-    stmt = select(Post).options(joinedload(Post.owner_details)).filter(Post.id == post_id)
+POST_COLUMNS = {
+    "title": Post.title,
+    "body": Post.body,
+    "image": Post.image,
+    "lat": Post.lat,
+    "lng": Post.lng,
+    "date": Post.date,
+    "time": Post.time,
+    "is_free": Post.is_free,
+    "category_id": Post.category_id,
+    "id": Post.id,
+    "owner": User.username.label("owner"),
+    "owner_id": Post.owner.label("owner_id"),
+}
+
+# Read back from the last row of every page to build the next cursor.
+KEYSET_FIELDS = ("date", "time", "id")
+
+
+def select_posts(fields: Sequence[str] | None = None):
+    # Only the columns the response needs, with the owner's username joined
+    # in when asked for: rows come back as plain tuples that pydantic reads
+    # by attribute, with no ORM entities to hydrate and no per-row dict.
+    names = dict.fromkeys([*(fields or POST_COLUMNS), *KEYSET_FIELDS])
+    stmt = select(*(POST_COLUMNS[name] for name in names))
+    if "owner" in names:
+        stmt = stmt.join(User, Post.owner == User.id)
+    return stmt
+
+
+async def get_post(session: AsyncSession, post_id: int):
+    stmt = select_posts().filter(Post.id == post_id)
     result: Result = await session.execute(stmt)
-    post = result.scalar()
+    post = result.first()
 
     if post is not None:
-        post_dict = {
-            "id": post.id,
-            "owner": post.owner_details.username,
-            "owner_id": post.owner_details.id,
-            "title": post.title, 
-            "body": post.body, 
-            "image": post.image, 
-            "date": post.date,
-            "time": post.time, 
-            "is_free": post.is_free,
-            "lat": post.lat, 
-            "lng": post.lng, 
-        }
-        return post_dict
+        return post
     else:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -54,57 +117,126 @@ async def get_post(session: AsyncSession, post_id: int) -> dict | None:
         )
 
 
-async def get_posts(session: AsyncSession) -> list[dict]:
-    stmt = select(Post).options(joinedload(Post.owner_details)).order_by(Post.id)
+def in_viewport(viewport: Viewport):
+    # Same expression as the ix_posts_location GiST index, so the planner
+    # answers the box containment from the index instead of a seq scan.
+    return func.point(Post.lng, Post.lat).op("<@")(
+        func.box(
+            func.point(viewport.min_lng, viewport.min_lat),
+            func.point(viewport.max_lng, viewport.max_lat),
+        )
+    )
+
+
+def apply_post_filters(stmt, filters: PostFilters):
+    # Every bound is expressed on (date, time) so the planner can turn it
+    # into a range scan on ix_posts_date_time_id.
+    starts_at = tuple_(Post.date, Post.time)
+    if filters.dates is not None:
+        stmt = stmt.filter(Post.date == filters.dates)
+    if filters.date_from is not None:
+        stmt = stmt.filter(Post.date >= filters.date_from)
+    if filters.date_to is not None:
+        stmt = stmt.filter(Post.date <= filters.date_to)
+    if filters.time_from is not None:
+        stmt = stmt.filter(Post.time >= filters.time_from)
+    if filters.time_to is not None:
+        stmt = stmt.filter(Post.time <= filters.time_to)
+    if filters.upcoming or filters.within_hours is not None:
+        now = datetime.now()
+        stmt = stmt.filter(starts_at >= tuple_(now.date(), now.time()))
+        if filters.within_hours is not None:
+            until = now + timedelta(hours=filters.within_hours)
+            stmt = stmt.filter(starts_at <= tuple_(until.date(), until.time()))
+    return stmt
+
+
+async def paginate_posts(session: AsyncSession, stmt, page: PageParams) -> dict:
+    # Keyset pagination on (date, time, id): every page is an index range
+    # scan on ix_posts_date_time_id, however deep the client pages.
+    if page.cursor is not None:
+        after = decode_cursor(page.cursor, date.fromisoformat, time.fromisoformat, int)
+        stmt = stmt.filter(tuple_(Post.date, Post.time, Post.id) > tuple_(*after))
+    stmt = stmt.order_by(Post.date, Post.time, Post.id).limit(page.limit + 1)
     result: Result = await session.execute(stmt)
-    posts = result.scalars().all()
-    return [
-        {
-            "id": post.id, 
-            "owner": post.owner_details.username, 
-            "owner_id": post.owner_details.id, 
-            "title": post.title, 
-            "body": post.body, 
-            "image": post.image, 
-            "date": post.date,
-            "time": post.time, 
-            "is_free": post.is_free,
-            "lat": post.lat, 
-            "lng": post.lng, 
-        } for post in posts
-    ]
+    posts = result.all()
 
+    next_cursor = None
+    if len(posts) > page.limit:
+        posts = posts[:page.limit]
+        last = posts[-1]
+        next_cursor = encode_cursor([last.date, last.time, last.id])
+    return {"items": posts, "next_cursor": next_cursor}
+
+
+async def get_posts(
+        session: AsyncSession,
+        page: PageParams,
+        viewport: Viewport | None = None,
+        filters: PostFilters | None = None,
+        fields: Sequence[str] | None = None,
+    ) -> dict:
+    stmt = select_posts(fields)
+    if viewport is not None:
+        stmt = stmt.filter(in_viewport(viewport))
+    if filters is not None:
+        stmt = apply_post_filters(stmt, filters)
+    return await paginate_posts(session, stmt, page)
 
 
+async def raise_write_miss(session: AsyncSession, post_id: int):
+    # A guarded write matched no row: the post is gone or not the user's.
+    # Only this failure path pays for a second query.
+    if await session.scalar(select(Post.id).filter(Post.id == post_id)) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post not found",
+        )
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="It's not your post"
+    )
+
 
 async def update_post(
         session: AsyncSession,
         post_id: int,
         post_update: schemas.PostUpdatePatch,
         current_user_id: int,
-    ) -> schemas.PostCreate:
-    stmt = select(Post).filter(Post.id == post_id)
-    result: Result = await session.execute(stmt)
-    post = result.scalar()
-    if post.owner != current_user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="It's not your post"
+    ):
+    values = post_update.model_dump(exclude_unset=True)
+    await check_category(session, values.get("category_id"))
+    # One statement updates the post only if the user owns it. The locked
+    # subquery still holds the values from before the update, which the
+    # live event needs to move or remove markers.
+    previous = (
+        select(*(POST_COLUMNS[field] for field in schemas.SUMMARY_FIELDS))
+        .filter(Post.id == post_id, Post.owner == current_user_id)
+        .with_for_update()
+        .subquery("previous")
+    )
+    stmt = (
+        update(Post)
+        .where(Post.id == previous.c.id)
+        .values(**values)
+        .returning(
+            *(column for field, column in POST_COLUMNS.items() if field not in ("owner", "owner_id")),
+            *(previous.c[field].label(f"previous_{field}") for field in schemas.SUMMARY_FIELDS),
         )
+        .execution_options(synchronize_session=False)
+    )
+    result: Result = await session.execute(stmt)
+    post = result.first()
+    if post is None:
+        await raise_write_miss(session, post_id)
 
-    if post is not None:
-        post_data = post_update.dict(exclude_unset=True)
-        post_data["date"] = date.fromisoformat(str(post_data["date"]))
-        post_data["time"] = time.fromisoformat(str(post_data["time"]))
-        for key, value in post_data.items():
-            setattr(post, key, value)
-        await session.commit()
-        return post
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post not found",
-        )
+    previous = schemas.PostSummary.model_validate(
+        {field: getattr(post, f"previous_{field}") for field in schemas.SUMMARY_FIELDS}
+    ).model_dump(mode="json")
+    await publish(session, POSTS_CHANNEL, post_event("updated", post, previous))
+    await session.commit()
+    invalidate_post_caches()
+    return post
 
 
 async def delete_post(
@@ -112,80 +244,229 @@ async def delete_post(
         post_id: int, 
         current_user_id: int
     ) -> str:
-    stmt = select(Post).filter(Post.id == post_id)
+    stmt = (
+        delete(Post)
+        .where(Post.id == post_id, Post.owner == current_user_id)
+        .returning(*(POST_COLUMNS[field] for field in schemas.SUMMARY_FIELDS))
+        .execution_options(synchronize_session=False)
+    )
     result: Result = await session.execute(stmt)
-    post = result.scalar()
+    post = result.first()
+    if post is None:
+        await raise_write_miss(session, post_id)
 
-    if post.owner != current_user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="It's not your post"
-        )
-    
-    if post is not None:
-        await session.delete(post)
-        await session.commit()
-        return "Post deleted successfully"
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post not found",
+    await publish(session, POSTS_CHANNEL, post_event("deleted", post))
+    await session.commit()
+    invalidate_post_caches()
+    return "Post deleted successfully"
+
+
+def cluster_cell_size(zoom: int) -> float:
+    return 360 / (2 ** zoom * (256 / CLUSTER_CELL_PX))
+
+
+def snap_viewport(viewport: Viewport, cell: float) -> Viewport:
+    # Widen the box to whole grid cells: clusters on the edge are complete
+    # and nearby pans at the same zoom share a cache key.
+    return Viewport(
+        min_lat=max(math.floor(viewport.min_lat / cell) * cell, -90),
+        max_lat=min(math.ceil(viewport.max_lat / cell) * cell, 90),
+        min_lng=max(math.floor(viewport.min_lng / cell) * cell, -180),
+        max_lng=min(math.ceil(viewport.max_lng / cell) * cell, 180),
+    )
+
+
+async def get_clusters(session: AsyncSession, zoom: int, viewport: Viewport) -> list[dict]:
+    cell = cluster_cell_size(zoom)
+    viewport = snap_viewport(viewport, cell)
+    key = (zoom, viewport.min_lat, viewport.max_lat, viewport.min_lng, viewport.max_lng)
+    clusters = clusters_cache.get(key)
+    if clusters is not None:
+        return clusters
+
+    cell_x = func.floor(Post.lng / cell)
+    cell_y = func.floor(Post.lat / cell)
+    stmt = (
+        select(
+            func.count(Post.id).label("count"),
+            func.avg(Post.lat).label("lat"),
+            func.avg(Post.lng).label("lng"),
+            array_agg(aggregate_order_by(Post.id, Post.id.desc()))[1:CLUSTER_SAMPLE_SIZE].label("post_ids"),
         )
-    
+        .filter(in_viewport(viewport))
+        .group_by(cell_x, cell_y)
+    )
+    result: Result = await session.execute(stmt)
+    clusters = [
+        {"count": row.count, "lat": row.lat, "lng": row.lng, "post_ids": row.post_ids}
+        for row in result
+    ]
+    clusters_cache.set(key, clusters)
+    return clusters
+
+
+async def search_posts(
+        session: AsyncSession,
+        q: str,
+        page: PageParams,
+        filters: PostFilters | None = None,
+        fields: Sequence[str] | None = None,
+    ) -> dict:
+    # Ranked matches, paged by keyset on (rank DESC, id). ts_rank_cd returns
+    # a real, which round-trips exactly through the JSON cursor.
+    query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+    rank = func.ts_rank_cd(Post.search_vector, query)
+    stmt = (
+        select_posts(fields)
+        .add_columns(rank.label("rank"))
+        .filter(Post.search_vector.bool_op("@@")(query))
+    )
+    if filters is not None:
+        stmt = apply_post_filters(stmt, filters)
+    if page.cursor is not None:
+        after_rank, after_id = decode_cursor(page.cursor, float, int)
+        stmt = stmt.filter(or_(rank < after_rank, and_(rank == after_rank, Post.id > after_id)))
+    stmt = stmt.order_by(rank.desc(), Post.id).limit(page.limit + 1)
+    result: Result = await session.execute(stmt)
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        next_cursor = encode_cursor([rows[-1].rank, rows[-1].id])
+    return {"items": rows, "next_cursor": next_cursor}
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_KM / 180
+
+
+def radius_viewport(lat: float, lng: float, radius_km: float) -> Viewport:
+    # The smallest lat/lng box holding the circle. A degree of longitude
+    # shrinks with cos(lat), so the box is sized at the edge nearest the
+    # pole; circles reaching a pole span every longitude. Circles crossing
+    # the antimeridian are cut at +-180.
+    delta_lat = radius_km / KM_PER_DEGREE_LAT
+    min_lat = max(lat - delta_lat, -90)
+    max_lat = min(lat + delta_lat, 90)
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if max_lat == 90 or min_lat == -90 or radius_km >= KM_PER_DEGREE_LAT * cos_lat * 180:
+        return Viewport(min_lat=min_lat, max_lat=max_lat, min_lng=-180, max_lng=180)
+    delta_lng = radius_km / (KM_PER_DEGREE_LAT * cos_lat)
+    return Viewport(
+        min_lat=min_lat,
+        max_lat=max_lat,
+        min_lng=max(lng - delta_lng, -180),
+        max_lng=min(lng + delta_lng, 180),
+    )
+
+
+def great_circle_km(lat: float, lng: float):
+    # Haversine distance from (lat, lng) to each post.
+    half_chord = (
+        func.power(func.sin(func.radians(Post.lat - lat) / 2), 2)
+        + math.cos(math.radians(lat))
+        * func.cos(func.radians(Post.lat))
+        * func.power(func.sin(func.radians(Post.lng - lng) / 2), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * func.asin(func.least(1.0, func.sqrt(half_chord)))
+
+
+async def get_nearby_posts(
+        session: AsyncSession,
+        lat: float,
+        lng: float,
+        radius_km: float,
+        limit: int,
+        filters: PostFilters | None = None,
+    ) -> list:
+    # Two passes over ix_posts_location. A KNN scan takes the `limit` posts
+    # nearest in lng/lat degrees; the farthest of them by haversine bounds
+    # the answer, since `limit` posts lie at most that far. The second pass
+    # ranks every post within that distance, found through the box around
+    # it, so posts that are close but off in longitude, where degrees are
+    # shorter, are not missed. Users are joined only for the final rows.
+    distance = great_circle_km(lat, lng)
+    candidates = select(distance)
+    if filters is not None and filters != PostFilters():
+        # Matches may be sparse, and the KNN scan would walk past the
+        # circle looking for them; the box bounds it.
+        candidates = candidates.filter(in_viewport(radius_viewport(lat, lng, radius_km)))
+        candidates = apply_post_filters(candidates, filters)
+    candidates = candidates.order_by(func.point(Post.lng, Post.lat).op("<->")(func.point(lng, lat))).limit(limit)
+    distances = (await session.execute(candidates)).scalars().all()
+    bound_km = min(max(distances), radius_km) if len(distances) == limit else radius_km
+
+    nearest = select(Post.id, distance.label("distance_km")).filter(
+        in_viewport(radius_viewport(lat, lng, bound_km)),
+        distance <= bound_km,
+    )
+    if filters is not None:
+        nearest = apply_post_filters(nearest, filters)
+    nearest = nearest.order_by(distance, Post.id).limit(limit).subquery("nearest")
+    stmt = (
+        select_posts()
+        .add_columns(nearest.c.distance_km)
+        .join(nearest, nearest.c.id == Post.id)
+        .order_by(nearest.c.distance_km, Post.id)
+    )
+    result: Result = await session.execute(stmt)
+    return result.all()
 
 
 async def create_category(db: AsyncSession, category: schemas.CategoryCreate) -> models.Category:
-    db_category = models.Category(**category.dict())
+    db_category = models.Category(**category.model_dump())
     db.add(db_category)
     await db.commit()
     await db.refresh(db_category)
     return db_category
 
-async def get_categories(db: AsyncSession) -> List[models.Category]:
-    async with db:
-        result = await db.execute(select(models.Category))
-        categories = result.scalars().all()
-    return categories
+async def get_categories(db: AsyncSession) -> list[dict]:
+    now = datetime.now()
+    upcoming = tuple_(Post.date, Post.time) >= tuple_(now.date(), now.time())
+    stmt = (
+        select(
+            Category.id,
+            Category.name,
+            func.count(Post.id).label("post_count"),
+            func.count(Post.id).filter(upcoming).label("upcoming_count"),
+        )
+        .outerjoin(Post, Post.category_id == Category.id)
+        .group_by(Category.id)
+        .order_by(Category.name)
+    )
+    result = await db.execute(stmt)
+    return [row._asdict() for row in result]
+
+async def get_category_posts(
+        session: AsyncSession,
+        category_id: int,
+        page: PageParams,
+        fields: Sequence[str] | None = None,
+    ) -> dict:
+    stmt = select_posts(fields).filter(Post.category_id == category_id)
+    return await paginate_posts(session, stmt, page)
 
 async def update_category(db: AsyncSession, category_id: int, category_data: schemas.CategoryCreate) -> models.Category:
-    async with db:
-        result = await db.execute(select(models.Category).where(models.Category.id == category_id))
-        category = result.scalar()
-        if category:
-            for key, value in category_data.dict().items():
-                setattr(category, key, value)
-            await db.commit()
-            await db.refresh(category)
-            return category
-        else:
-            raise HTTPException(status_code=404, detail="Category not found")
+    result = await db.execute(select(models.Category).where(models.Category.id == category_id))
+    category = result.scalar()
+    if category:
+        for key, value in category_data.model_dump().items():
+            setattr(category, key, value)
+        await db.commit()
+        await db.refresh(category)
+        return category
+    else:
+        raise HTTPException(status_code=404, detail="Category not found")
 
 async def delete_category(db: AsyncSession, category_id: int) -> None:
-    async with db:
-        result = await db.execute(select(models.Category).where(models.Category.id == category_id))
-        category = result.scalar()
-        if category:
-            await db.delete(category)
-            await db.commit()
-        else:
-            raise HTTPException(status_code=404, detail="Category not found")
-        
-async def get_posts_by_dates(session: AsyncSession, dates: date) -> list[dict] | None:
-    query = select(Post).options(joinedload(Post.owner_details)).filter(Post.date == dates)
-    result = await session.execute(query)
-    posts = result.scalars().all()
-    return [
-        {
-            "id": post.id, 
-            "owner": post.owner_details.username, 
-            "owner_id": post.owner_details.id, 
-            "title": post.title, 
-            "body": post.body, 
-            "image": post.image, 
-            "date": post.date,
-            "time": post.time, 
-            "is_free": post.is_free,
-            "lat": post.lat, 
-            "lng": post.lng, 
-        } for post in posts
-    ]
\ No newline at end of file
+    result = await db.execute(select(models.Category).where(models.Category.id == category_id))
+    category = result.scalar()
+    if category:
+        await db.delete(category)
+        # Its posts are left without a category.
+        await publish(db, POSTS_CHANNEL, RESET)
+        await db.commit()
+        invalidate_post_caches()
+    else:
+        raise HTTPException(status_code=404, detail="Category not found")
@@ -1,52 +1,33 @@
+import math
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import Depends, HTTPException, status, Path
-from typing import Annotated, Optional
-from app.users.crud import get_user
-from app.users.auth import oauth2_scheme
+from fastapi import Depends, HTTPException, status, Path, Query
+from typing import Annotated, Literal, Optional
+from app.users.auth import get_current_user
 from app.users.models import User
 from .crud import get_post
-from jose import JWTError, jwt
 from sqlalchemy.orm import Session
-from ..database import get_db, scoped_session_dependency
+from ..database import get_session
 from .models import Post
+from .schemas import POST_FIELDS, SUMMARY_FIELDS, PostFilters, Viewport
+from datetime import date, time
 from sqlalchemy.future import select
 from sqlalchemy.orm import joinedload, selectinload
 
-SECRET_KEY = "hjvx blju bnxv jovh"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-
 
-async def get_current_vip_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    vip_credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="You couldn't create post if you have not a VIP status",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        user = await get_user(db, username=username)
-        if user.is_vip == False:
-            raise vip_credentials_exception
-    except JWTError:
-        raise credentials_exception
-    if user is None:
-        raise credentials_exception
+async def get_current_vip_user(user: User = Depends(get_current_user)):
+    if not user.is_vip:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="You couldn't create post if you have not a VIP status",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
 async def post_by_id(
     post_id: Annotated[int, Path],
-    session: AsyncSession = Depends(scoped_session_dependency),
+    session: AsyncSession = Depends(get_session),
 ) -> Post:
     post = await get_post(session=session, post_id=post_id)
     if post is not None:
@@ -54,4 +35,99 @@ async def post_by_id(
 
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND, detail=f"post {post_id} not found!"
-    )
\ No newline at end of file
+    )
+
+
+async def viewport(
+    min_lat: Optional[float] = Query(None, ge=-90, le=90),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90),
+    min_lng: Optional[float] = Query(None, ge=-180, le=180),
+    max_lng: Optional[float] = Query(None, ge=-180, le=180),
+) -> Optional[Viewport]:
+    bounds = (min_lat, max_lat, min_lng, max_lng)
+    if all(bound is None for bound in bounds):
+        return None
+    if any(bound is None for bound in bounds):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="min_lat, max_lat, min_lng and max_lng must be passed together",
+        )
+    if min_lat > max_lat or min_lng > max_lng:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Viewport minimums must not exceed maximums",
+        )
+    return Viewport(min_lat=min_lat, max_lat=max_lat, min_lng=min_lng, max_lng=max_lng)
+
+
+async def bbox_viewport(
+    bbox: str = Query(..., description="min_lng,min_lat,max_lng,max_lat"),
+) -> Viewport:
+    try:
+        min_lng, min_lat, max_lng, max_lat = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="bbox must be min_lng,min_lat,max_lng,max_lat",
+        )
+    # Called directly, viewport() skips its Query bounds; float() also
+    # accepts nan and inf.
+    if not (
+        all(math.isfinite(value) for value in (min_lng, min_lat, max_lng, max_lat))
+        and -90 <= min_lat <= 90 and -90 <= max_lat <= 90
+        and -180 <= min_lng <= 180 and -180 <= max_lng <= 180
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="bbox latitudes must be within [-90, 90] and longitudes within [-180, 180]",
+        )
+    return await viewport(min_lat=min_lat, max_lat=max_lat, min_lng=min_lng, max_lng=max_lng)
+
+
+async def post_filters(
+    dates: Optional[date] = Query(None, description="Exact day"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    time_from: Optional[time] = Query(None, description="Earliest start time of day"),
+    time_to: Optional[time] = Query(None, description="Latest start time of day"),
+    upcoming: bool = Query(False, description="Only events that have not started yet"),
+    within_hours: Optional[int] = Query(None, ge=1, le=24 * 7, description="Only events starting in the next N hours"),
+) -> PostFilters:
+    if date_from is not None and date_to is not None and date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="date_from must not be after date_to",
+        )
+    return PostFilters(
+        dates=dates,
+        date_from=date_from,
+        date_to=date_to,
+        time_from=time_from,
+        time_to=time_to,
+        upcoming=upcoming,
+        within_hours=within_hours,
+    )
+
+
+async def post_fields(
+    fields: Optional[str] = Query(None, description="Comma-separated post fields to return, e.g. id,lat,lng,title"),
+    view: Optional[Literal["summary"]] = Query(None, description="summary: only what a map marker needs"),
+) -> Optional[tuple[str, ...]]:
+    if fields is not None and view is not None:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Pass either fields or view, not both",
+        )
+    if view == "summary":
+        return SUMMARY_FIELDS
+    if fields is None:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(POST_FIELDS)
+    if not requested or unknown:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"fields must be a comma-separated subset of: {', '.join(POST_FIELDS)}",
+        )
+    # Canonical order, so equal field sets share one response model.
+    return tuple(name for name in POST_FIELDS if name in requested)
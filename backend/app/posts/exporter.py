@@ -0,0 +1,61 @@
+import csv
+import io
+from typing import AsyncIterator, Sequence
+
+from pydantic import TypeAdapter
+
+from ..database import read_engine
+from . import schemas
+from .crud import apply_post_filters, select_posts
+from .models import Post
+
+EXPORT_BATCH_SIZE = 1000
+
+
+async def iter_post_batches(
+        filters: schemas.PostFilters | None = None,
+        fields: Sequence[str] | None = None,
+    ) -> AsyncIterator[list]:
+    # A server-side cursor fetched EXPORT_BATCH_SIZE rows at a time: only one
+    # batch is ever held in memory, however large the table. The connection
+    # is the generator's own, because the request's session is closed
+    # before a streaming body starts.
+    stmt = select_posts(fields)
+    if filters is not None:
+        stmt = apply_post_filters(stmt, filters)
+    stmt = stmt.order_by(Post.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    async with read_engine.connect() as connection:
+        result = await connection.stream(stmt)
+        async for batch in result.partitions():
+            yield batch
+
+
+async def iter_ndjson(
+        filters: schemas.PostFilters | None = None,
+        fields: Sequence[str] | None = None,
+    ) -> AsyncIterator[bytes]:
+    adapter = TypeAdapter(schemas.post_fields_model(tuple(fields)) if fields else schemas.PostGet)
+    async for batch in iter_post_batches(filters, fields):
+        yield b"".join(
+            adapter.dump_json(adapter.validate_python(row, from_attributes=True)) + b"\n"
+            for row in batch
+        )
+
+
+async def iter_csv(
+        filters: schemas.PostFilters | None = None,
+        fields: Sequence[str] | None = None,
+    ) -> AsyncIterator[bytes]:
+    # Same columns as the CSV import expects, so an export can be loaded back.
+    columns = list(fields or schemas.POST_FIELDS)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for batch in iter_post_batches(filters, fields):
+        for row in batch:
+            writer.writerow(getattr(row, column) for column in columns)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
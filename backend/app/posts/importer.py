@@ -0,0 +1,167 @@
+import codecs
+import csv
+import json
+from datetime import datetime
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from . import schemas
+from ..pubsub import RESET, publish
+from .crud import POSTS_CHANNEL, invalidate_post_caches
+from .models import Category, Post
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+COPY_COLUMNS = (
+    "title", "body", "image", "lat", "lng", "date", "time", "is_free",
+    "category_id", "owner", "created_at", "updated_at",
+)
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    async for chunk in chunks:
+        lines = (tail + decoder.decode(chunk)).split("\n")
+        tail = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail.rstrip("\r")
+
+
+async def iter_ndjson_rows(lines: AsyncIterator[str]) -> AsyncIterator[tuple[int, dict | str]]:
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as e:
+            yield line_no, f"Invalid JSON: {e}"
+
+
+async def iter_csv_records(lines: AsyncIterator[str]) -> AsyncIterator[tuple[int, str]]:
+    # Joins lines until every quoted field is closed, so a quoted field may
+    # span lines (post bodies do) while parsing stays streaming. Doubled
+    # quotes inside a field keep the count even.
+    record: list[str] = []
+    start = 0
+    quotes = 0
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not record:
+            start = line_no
+        record.append(line)
+        quotes += line.count('"')
+        if quotes % 2 == 0:
+            yield start, "\n".join(record)
+            record = []
+            quotes = 0
+    if record:
+        yield start, "\n".join(record)
+
+
+async def iter_csv_rows(lines: AsyncIterator[str]) -> AsyncIterator[tuple[int, dict | str]]:
+    header = None
+    async for line_no, record in iter_csv_records(lines):
+        if not record.strip():
+            continue
+        try:
+            values = next(csv.reader([record], strict=True))
+        except csv.Error as e:
+            yield line_no, f"Invalid CSV: {e}"
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield line_no, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        row = dict(zip(header, values))
+        if row.get("category_id") == "":
+            row["category_id"] = None
+        yield line_no, row
+
+
+def format_validation_error(error: ValidationError) -> list[str]:
+    return [
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}"
+        for item in error.errors()
+    ]
+
+
+async def copy_posts(session: AsyncSession, records: list[tuple]) -> None:
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        Post.__tablename__,
+        records=records,
+        columns=COPY_COLUMNS,
+    )
+
+
+async def import_posts(
+        session: AsyncSession,
+        rows: AsyncIterator[tuple[int, dict | str]],
+        owner_id: int,
+    ) -> dict:
+    # Rows are validated one at a time and loaded with COPY in batches inside
+    # a single transaction. Invalid rows are reported and skipped; the rest
+    # of the import goes through. PostBase checks everything the posts
+    # columns enforce, so a row that passes cannot fail its COPY batch.
+    category_ids = set((await session.execute(select(Category.id))).scalars())
+    batch: list[tuple] = []
+    imported = 0
+    failed = 0
+    errors: list[dict] = []
+
+    def reject(line_no: int, messages: list[str]) -> None:
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": line_no, "errors": messages})
+
+    async for line_no, row in rows:
+        if isinstance(row, str):
+            reject(line_no, [row])
+            continue
+        if not isinstance(row, dict):
+            reject(line_no, ["Expected an object"])
+            continue
+        try:
+            post = schemas.PostBase(**row)
+        except ValidationError as e:
+            reject(line_no, format_validation_error(e))
+            continue
+        if post.category_id is not None and post.category_id not in category_ids:
+            reject(line_no, [f"category_id: category {post.category_id} does not exist"])
+            continue
+
+        now = datetime.utcnow()
+        batch.append((
+            post.title, post.body, post.image, post.lat, post.lng, post.date,
+            post.time, post.is_free, post.category_id, owner_id, now, now,
+        ))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await copy_posts(session, batch)
+            imported += len(batch)
+            batch = []
+
+    if batch:
+        await copy_posts(session, batch)
+        imported += len(batch)
+    if imported:
+        # Too many posts for one event each: every worker drops its cached
+        # responses and live clients reload.
+        await publish(session, POSTS_CHANNEL, RESET)
+    await session.commit()
+    invalidate_post_caches()
+    return {"imported": imported, "failed": failed, "errors": errors}
@@ -0,0 +1,74 @@
+import asyncio
+import json
+from datetime import date, datetime, time, timedelta
+from typing import AsyncIterator
+
+from ..pubsub import RESET, pubsub
+from .crud import POSTS_CHANNEL, invalidate_post_caches
+from .schemas import PostFilters, Viewport
+
+KEEPALIVE_SECONDS = 15
+
+
+def post_matches(post: dict, viewport: Viewport | None, filters: PostFilters) -> bool:
+    # The same conditions as crud.apply_post_filters and in_viewport, checked
+    # on a single post.
+    if viewport is not None and not (
+        viewport.min_lat <= post["lat"] <= viewport.max_lat
+        and viewport.min_lng <= post["lng"] <= viewport.max_lng
+    ):
+        return False
+    day = date.fromisoformat(post["date"])
+    at = time.fromisoformat(post["time"])
+    if filters.dates is not None and day != filters.dates:
+        return False
+    if filters.date_from is not None and day < filters.date_from:
+        return False
+    if filters.date_to is not None and day > filters.date_to:
+        return False
+    if filters.time_from is not None and at < filters.time_from:
+        return False
+    if filters.time_to is not None and at > filters.time_to:
+        return False
+    if filters.upcoming or filters.within_hours is not None:
+        now = datetime.now()
+        starts_at = datetime.combine(day, at)
+        if starts_at < now:
+            return False
+        if filters.within_hours is not None and starts_at > now + timedelta(hours=filters.within_hours):
+            return False
+    return True
+
+
+def event_matches(message: dict, viewport: Viewport | None, filters: PostFilters) -> bool:
+    # An update is sent both to clients that could see the post before and
+    # to those that can see it now, so markers that move out are removed.
+    return any(
+        post is not None and post_matches(post, viewport, filters)
+        for post in (message["post"], message.get("previous"))
+    )
+
+
+def server_sent_event(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+async def iter_post_events(viewport: Viewport | None, filters: PostFilters) -> AsyncIterator[bytes]:
+    async with pubsub.subscribe(POSTS_CHANNEL) as queue:
+        yield f"retry: {KEEPALIVE_SECONDS * 1000}\n\n".encode()
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle stream.
+                yield b": keep-alive\n\n"
+                continue
+            if message is RESET:
+                yield server_sent_event("reset", {})
+            elif event_matches(message, viewport, filters):
+                yield server_sent_event(message["event"], message["post"])
+
+
+# Every worker clears its response caches on post changes made by any
+# worker, not only on its own writes.
+pubsub.on(POSTS_CHANNEL, lambda message: invalidate_post_caches())
@@ -4,11 +4,16 @@ from datetime import datetime, date, time
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from ..database import Base
-from sqlalchemy import String, Text, Column, Integer
+from sqlalchemy import String, Text, Column, Integer, Index, Computed, func
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
 if TYPE_CHECKING:
     from app.users.models import User
 
+# Postgres text search configuration for post search. "russian" stems
+# Cyrillic words and falls back to the English stemmer for Latin ones.
+SEARCH_CONFIG = "russian"
+
 
 class Post(Base):
     title: Mapped[str] = mapped_column(String(100), unique=False)
@@ -22,7 +27,16 @@ class Post(Base):
     date: Mapped[date]
     time: Mapped[time]
     is_free: Mapped[bool]
-    category_id = Column(Integer, ForeignKey('categories.id'))
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            f"to_tsvector('{SEARCH_CONFIG}', coalesce(title, '') || ' ' || coalesce(body, ''))",
+            persisted=True,
+        ),
+        nullable=True,
+        deferred=True,
+    )
+    category_id = Column(Integer, ForeignKey('categories.id', ondelete='SET NULL'))
     category = relationship('Category', back_populates='posts')
     owner_details: Mapped["User"] = relationship("User", back_populates='posts')
 
@@ -31,4 +45,23 @@ class Category(Base):
     __tablename__ = 'categories'
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(50), unique=True, index=True)
-    posts = relationship('Post', back_populates='category')
\ No newline at end of file
+    # Postgres clears category_id on the posts of a deleted category.
+    posts = relationship('Post', back_populates='category', passive_deletes=True)
+
+
+# GiST index over point(lng, lat); map viewport queries filter with
+# ``point(lng, lat) <@ box(...)`` and must use the very same expression.
+Index(
+    "ix_posts_location",
+    func.point(Post.lng, Post.lat),
+    postgresql_using="gist",
+)
+
+# Keyset pagination order for post listings.
+Index("ix_posts_date_time_id", Post.date, Post.time, Post.id)
+
+# Per-category counts and the paged category detail listing.
+Index("ix_posts_category_id_date_time_id", Post.category_id, Post.date, Post.time, Post.id)
+
+# Full-text search over title and body.
+Index("ix_posts_search_vector", Post.search_vector, postgresql_using="gin")
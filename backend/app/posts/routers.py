@@ -1,18 +1,46 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, File, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from .models import Post
-from .schemas import PostBase, PostCreate, PostUpdatePut, PostGet, PostUpdatePatch
-from ..database import scoped_session_dependency
+from .schemas import PostBase, PostCreate, PostUpdatePut, PostGet, PostUpdatePatch, PostUpdated
+from ..database import get_cached_read_session, get_session
 from sqlalchemy.ext.asyncio import AsyncSession
-from . import crud, schemas
+from . import crud, exporter, importer, live, schemas
 from app.users.models import User   
 from app.users.auth import get_current_admin
-from .dependencies import get_current_vip_user, post_by_id
+from .dependencies import get_current_vip_user, viewport, bbox_viewport, post_filters, post_fields
 from . import models
-from typing import List, Optional
-from ..database import get_db
+from functools import lru_cache
+from typing import List, Literal, Optional
+from pydantic import TypeAdapter
+from .. import media
+from ..cache import cached_json_response
+from ..config import settings
+from ..pagination import Page, PageParams, page_params
 from datetime import date
 router = APIRouter(prefix='/post', tags=['posts'])
 
+# crud returns column rows rather than ORM objects or dicts; they are
+# validated once by attribute and dumped straight to JSON bytes, bypassing
+# FastAPI's response_model re-validation and jsonable_encoder.
+post_adapter = TypeAdapter(PostGet)
+post_page_adapter = TypeAdapter(Page[PostGet])
+nearby_posts_adapter = TypeAdapter(List[schemas.PostNearby])
+
+
+def render_post(post) -> bytes:
+    return post_adapter.dump_json(post_adapter.validate_python(post, from_attributes=True))
+
+
+@lru_cache(maxsize=128)
+def post_page_adapter_for(fields: tuple[str, ...]) -> TypeAdapter:
+    return TypeAdapter(Page[schemas.post_fields_model(fields)])
+
+
+def render_post_page(posts: dict, fields: tuple[str, ...] | None = None) -> bytes:
+    adapter = post_page_adapter if fields is None else post_page_adapter_for(fields)
+    return adapter.dump_json(adapter.validate_python(posts, from_attributes=True))
+
+
 @router.post(
     "/",
     response_model=PostCreate,
@@ -20,7 +48,7 @@ router = APIRouter(prefix='/post', tags=['posts'])
 )
 async def create_post(
     post_in: PostBase,
-    session: AsyncSession = Depends(scoped_session_dependency),
+    session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_vip_user)
 ):
     current_user_id = current_user.id
@@ -31,31 +59,189 @@ async def create_post(
     )
 
 
-@router.get("/", response_model=list[PostGet])
+@router.post("/import/", response_model=schemas.ImportResult)
+async def import_posts(
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+    current_admin: User = Depends(get_current_admin),
+) -> schemas.ImportResult:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in ("application/x-ndjson", "application/jsonl", "application/json-lines"):
+        rows = importer.iter_ndjson_rows(importer.iter_lines(request.stream()))
+    elif content_type == "text/csv":
+        rows = importer.iter_csv_rows(importer.iter_lines(request.stream()))
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send posts as application/x-ndjson or text/csv",
+        )
+    return await importer.import_posts(session=session, rows=rows, owner_id=current_admin.id)
+
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", exporter.iter_ndjson),
+    "csv": ("text/csv; charset=utf-8", exporter.iter_csv),
+}
+
+
+@router.get("/export/")
+async def export_posts(
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    filters: schemas.PostFilters = Depends(post_filters),
+    fields: Optional[tuple[str, ...]] = Depends(post_fields),
+    current_admin: User = Depends(get_current_admin),
+) -> StreamingResponse:
+    media_type, render = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        render(filters=filters, fields=fields),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="posts.{format}"'},
+    )
+
+
+@router.post(
+    "/images/",
+    response_model=schemas.ImageUpload,
+    status_code=status.HTTP_201_CREATED,
+)
+async def upload_image(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_vip_user),
+) -> schemas.ImageUpload:
+    data = await file.read(settings.MAX_IMAGE_BYTES + 1)
+    if len(data) > settings.MAX_IMAGE_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Images are limited to {settings.MAX_IMAGE_BYTES} bytes",
+        )
+    try:
+        path = await media.save_image(data)
+    except media.InvalidImage as e:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=str(e))
+    # Posts keep the original's URL path as their image reference.
+    urls = media.image_urls(path)
+    return {"image": urls["original"], "urls": urls}
+
+
+@router.get("/", response_model=Page[PostGet])
 async def get_posts(
-    dates: date = None,
-    session: AsyncSession = Depends(scoped_session_dependency),
-) -> List[PostGet]:
-    if dates:
-        return await crud.get_posts_by_dates(session=session, dates=dates)
-    return await crud.get_posts(session=session)
+    request: Request,
+    filters: schemas.PostFilters = Depends(post_filters),
+    bounds: Optional[schemas.Viewport] = Depends(viewport),
+    page: PageParams = Depends(page_params),
+    fields: Optional[tuple[str, ...]] = Depends(post_fields),
+    session: AsyncSession = Depends(get_cached_read_session),
+) -> Response:
+    async def render() -> bytes:
+        posts = await crud.get_posts(session=session, page=page, viewport=bounds, filters=filters, fields=fields)
+        return render_post_page(posts, fields)
+
+    return await cached_json_response(request, crud.responses_cache, render)
+
+
+@router.get("/live/")
+async def live_posts(
+    filters: schemas.PostFilters = Depends(post_filters),
+    bounds: Optional[schemas.Viewport] = Depends(viewport),
+) -> StreamingResponse:
+    # Server-Sent Events: "created", "updated" and "deleted" carry the post
+    # summary; "reset" means events may have been missed and the client
+    # should reload its list.
+    return StreamingResponse(
+        live.iter_post_events(bounds, filters),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/nearby/", response_model=List[schemas.PostNearby])
+async def get_nearby_posts(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(10, gt=0, le=100),
+    limit: int = Query(20, ge=1, le=100),
+    filters: schemas.PostFilters = Depends(post_filters),
+    session: AsyncSession = Depends(get_session),
+) -> Response:
+    posts = await crud.get_nearby_posts(
+        session=session, lat=lat, lng=lng, radius_km=radius_km, limit=limit, filters=filters,
+    )
+    body = nearby_posts_adapter.dump_json(nearby_posts_adapter.validate_python(posts, from_attributes=True))
+    return Response(body, media_type="application/json")
+
+
+@router.get("/clusters/", response_model=List[schemas.Cluster])
+async def get_clusters(
+    response: Response,
+    zoom: int = Query(..., ge=0, le=22),
+    bounds: schemas.Viewport = Depends(bbox_viewport),
+    session: AsyncSession = Depends(get_cached_read_session),
+) -> List[schemas.Cluster]:
+    response.headers["Cache-Control"] = f"public, max-age={crud.clusters_cache.ttl}"
+    return await crud.get_clusters(session=session, zoom=zoom, viewport=bounds)
+
+
+@router.get("/search/", response_model=Page[PostGet])
+async def search_posts(
+    q: str = Query(..., min_length=1, max_length=200),
+    filters: schemas.PostFilters = Depends(post_filters),
+    page: PageParams = Depends(page_params),
+    fields: Optional[tuple[str, ...]] = Depends(post_fields),
+    session: AsyncSession = Depends(get_session),
+) -> Response:
+    posts = await crud.search_posts(session=session, q=q, page=page, filters=filters, fields=fields)
+    return Response(render_post_page(posts, fields), media_type="application/json")
+
+
+@router.post("/categories/", response_model=schemas.Category)
+async def create_category(category: schemas.CategoryCreate, db: AsyncSession = Depends(get_session), current_user: User = Depends(get_current_admin)):
+    return await crud.create_category(db=db, category=category)
+
+@router.get("/categories/", response_model=List[schemas.CategoryStats])
+async def read_categories(db: AsyncSession = Depends(get_session)):
+    return await crud.get_categories(db=db)
+
+@router.get("/categories/{category_id}/posts/", response_model=Page[PostGet])
+async def read_category_posts(
+    category_id: int,
+    page: PageParams = Depends(page_params),
+    fields: Optional[tuple[str, ...]] = Depends(post_fields),
+    session: AsyncSession = Depends(get_session),
+) -> Response:
+    posts = await crud.get_category_posts(session=session, category_id=category_id, page=page, fields=fields)
+    return Response(render_post_page(posts, fields), media_type="application/json")
+
+@router.put("/categories/{category_id}/", response_model=schemas.Category)
+async def update_category(category_id: int, category: schemas.CategoryCreate, db: AsyncSession = Depends(get_session), current_admin: User = Depends(get_current_admin)):
+    return await crud.update_category(db=db, category_id=category_id, category_data=category)
+
+@router.delete("/categories/{category_id}/")
+async def delete_category(category_id: int, db: AsyncSession = Depends(get_session), current_admin: User = Depends(get_current_admin)):
+    await crud.delete_category(db=db, category_id=category_id)
+    return {"detail": "Category deleted successfully"}
 
 
 @router.get("/{post_id}/", response_model=PostGet)
 async def get_post(
-    post: Post = Depends(post_by_id),
-) -> PostGet:
-    return post
+    post_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_cached_read_session),
+) -> Response:
+    async def render() -> bytes:
+        post = await crud.get_post(session=session, post_id=post_id)
+        return render_post(post)
+
+    return await cached_json_response(request, crud.responses_cache, render)
 
 
 
-@router.put("/{post_id}/", response_model=PostUpdatePut)
+@router.put("/{post_id}/", response_model=PostUpdated)
 async def put_update_post(
     post_id: int,
     post_update: PostUpdatePut,
-    session: AsyncSession = Depends(scoped_session_dependency),
+    session: AsyncSession = Depends(get_session),
     current_user_id: User = Depends(get_current_vip_user),
-) -> PostUpdatePut:
+) -> PostUpdated:
     user_id = current_user_id.id
     return await crud.update_post(
         session=session, 
@@ -65,13 +251,13 @@ async def put_update_post(
     )
 
 
-@router.patch("/{post_id}/", response_model=PostUpdatePatch)
+@router.patch("/{post_id}/", response_model=PostUpdated)
 async def patch_update_post(
     post_id: int,
     post_update: PostUpdatePatch,
-    session: AsyncSession = Depends(scoped_session_dependency),
+    session: AsyncSession = Depends(get_session),
     current_user_id: User = Depends(get_current_vip_user),
-) -> PostUpdatePatch:
+) -> PostUpdated:
     user_id = current_user_id.id
     return await crud.update_post(
         session=session, 
@@ -84,34 +270,8 @@ async def patch_update_post(
 @router.delete("/{post_id}/", response_model=str)
 async def delete_post(
     post_id: int,
-    session: AsyncSession = Depends(scoped_session_dependency),
+    session: AsyncSession = Depends(get_session),
     current_user_id: User = Depends(get_current_vip_user),
 ) -> str:
     user_id = current_user_id.id
     return await crud.delete_post(session=session, post_id=post_id, current_user_id=user_id)
-
-
-@router.post("/categories/", response_model=schemas.Category)
-async def create_category(category: schemas.CategoryCreate, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_admin)):
-    return await crud.create_category(db=db, category=category)
-
-@router.get("/categories/", response_model=List[schemas.Category])
-async def read_categories(db: AsyncSession = Depends(get_db)):
-    return await crud.get_categories(db=db)
-
-@router.put("/categories/{category_id}/", response_model=schemas.Category)
-async def update_category(category_id: int, category: schemas.CategoryCreate, db: AsyncSession = Depends(get_db), current_admin: User = Depends(get_current_admin)):
-    return await crud.update_category(db=db, category_id=category_id, category_data=category)
-
-@router.delete("/categories/{category_id}/")
-async def delete_category(category_id: int, db: AsyncSession = Depends(get_db), current_admin: User = Depends(get_current_admin)):
-    await crud.delete_category(db=db, category_id=category_id)
-    return {"detail": "Category deleted successfully"}
-
-
-@router.get("/", response_model=List[PostGet])
-async def get_posts_by_dates(
-    dates: date,
-    session: AsyncSession = Depends(scoped_session_dependency),
-) -> List[PostGet]:
-    return await crud.get_posts_by_dates(session=session, dates=dates)
\ No newline at end of file
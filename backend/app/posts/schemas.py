@@ -1,10 +1,10 @@
 from typing import TYPE_CHECKING
-from typing import Optional, List
+from typing import Annotated, Dict, Optional, List
+import datetime as dt
 from datetime import datetime, date, time
+from functools import lru_cache
 
-from pydantic import BaseModel
-
-from pydantic import BaseModel
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field, create_model, field_validator
 from typing import Optional
 
 
@@ -12,26 +12,77 @@ if TYPE_CHECKING:
     from app.users.models import User
 
 
+# Room for a media reference or an external URL, not for inline image data;
+# files go through the image upload endpoint.
+IMAGE_MAX_LENGTH = 2048
+# posts.title is varchar(100).
+TITLE_MAX_LENGTH = 100
+
+
+def reject_nul(value: str) -> str:
+    # Postgres text cannot hold NUL characters.
+    if "\x00" in value:
+        raise ValueError("must not contain NUL characters")
+    return value
+
+
+PostText = Annotated[str, AfterValidator(reject_nul)]
+Coordinate = Annotated[float, Field(allow_inf_nan=False)]
+
+
 class PostBase(BaseModel):
-    title: str
-    body: str
-    image: str
-    lat: float
-    lng: float
+    title: PostText = Field(max_length=TITLE_MAX_LENGTH)
+    body: PostText
+    image: PostText = Field(max_length=IMAGE_MAX_LENGTH)
+    lat: Coordinate
+    lng: Coordinate
     date: date
     time: time
     is_free: bool
+    category_id: Optional[int] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class PostGet(PostBase):
+    # Stored posts are served as they are, including ones written before
+    # the input checks.
+    image: str
+    lat: float
+    lng: float
     id: int
     owner: str
     owner_id: int
 
-    class Config:
-        orm_mode = True
+class PostNearby(PostGet):
+    distance_km: float
+
+
+class PostSummary(BaseModel):
+    # What a map marker needs; same field order as PostGet.
+    title: str
+    lat: float
+    lng: float
+    date: date
+    time: time
+    is_free: bool
+    id: int
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+POST_FIELDS = tuple(PostGet.model_fields)
+SUMMARY_FIELDS = tuple(PostSummary.model_fields)
+
+
+@lru_cache(maxsize=128)
+def post_fields_model(fields: tuple[str, ...]) -> type[BaseModel]:
+    if fields == SUMMARY_FIELDS:
+        return PostSummary
+    return create_model(
+        "PostFields",
+        __config__=ConfigDict(from_attributes=True),
+        **{name: (PostGet.model_fields[name].annotation, ...) for name in fields},
+    )
 
 class PostCreate(PostBase):
     owner: int
@@ -40,16 +91,76 @@ class PostUpdatePut(PostBase):
     pass
 
 
+class PostUpdated(PostBase):
+    # The PUT and PATCH response. Like PostGet, it takes any stored image: a
+    # PATCH that leaves the image alone may return one from before the cap.
+    image: str
+    lat: float
+    lng: float
+
+
 class PostUpdatePatch(PostBase):
-    title: Optional[str] = None
-    body: Optional[str] = None
-    image: Optional[str] = None
-    lat: Optional[float] = None
-    lng: Optional[float] = None
-    date: Optional[date]
-    time: Optional[time]
+    title: Optional[PostText] = Field(None, max_length=TITLE_MAX_LENGTH)
+    body: Optional[PostText] = None
+    image: Optional[PostText] = Field(None, max_length=IMAGE_MAX_LENGTH)
+    lat: Optional[Coordinate] = None
+    lng: Optional[Coordinate] = None
+    # The default is evaluated before the annotation, so a bare ``date``
+    # here would already name None.
+    date: Optional[dt.date] = None
+    time: Optional[dt.time] = None
     is_free: Optional[bool] = None
+    category_id: Optional[int] = None
+
+    # Fields may be left out, but only category_id may be set to null; the
+    # other columns are NOT NULL.
+    @field_validator("title", "body", "image", "lat", "lng", "date", "time", "is_free")
+    @classmethod
+    def reject_null(cls, value):
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
+
+
+
+class Viewport(BaseModel):
+    min_lat: float = Field(ge=-90, le=90)
+    max_lat: float = Field(ge=-90, le=90)
+    min_lng: float = Field(ge=-180, le=180)
+    max_lng: float = Field(ge=-180, le=180)
+
 
+class PostFilters(BaseModel):
+    dates: Optional[date] = None
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    time_from: Optional[time] = None
+    time_to: Optional[time] = None
+    upcoming: bool = False
+    within_hours: Optional[int] = None
+
+
+class Cluster(BaseModel):
+    count: int
+    lat: float
+    lng: float
+    post_ids: List[int]
+
+
+class ImageUpload(BaseModel):
+    image: str
+    urls: Dict[str, str]
+
+
+class ImportRowError(BaseModel):
+    line: int
+    errors: List[str]
+
+
+class ImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[ImportRowError]
 
 
 class CategoryBase(BaseModel):
@@ -60,7 +171,9 @@ class CategoryCreate(CategoryBase):
 
 class Category(CategoryBase):
     id: int
-    posts: List[PostBase] = []
 
-    class Config:
-        orm_mode = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class CategoryStats(Category):
+    post_count: int
+    upcoming_count: int
\ No newline at end of file
@@ -0,0 +1,118 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable
+
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import engine
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_SECONDS = 2
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Sent to callbacks and subscribers that may have missed messages: on every
+# (re)connect of the listener, and to a subscriber whose queue overflowed.
+# They should reload whatever state they derive from the channel. Writers
+# that change too much to describe publish it themselves.
+RESET = {"event": "reset"}
+
+
+async def publish(session: AsyncSession, channel: str, message: dict) -> None:
+    # pg_notify inside the caller's transaction: listeners in every worker
+    # receive the message on commit, and never if it rolls back. Payloads
+    # are limited to 8000 bytes.
+    await session.execute(select(func.pg_notify(channel, json.dumps(message, default=str))))
+
+
+class PubSub:
+    """Fans Postgres NOTIFY messages out to in-process subscribers.
+
+    Each worker holds one dedicated LISTEN connection, outside the pool, so
+    workers see each other's messages without an external broker.
+    """
+
+    def __init__(self):
+        self._callbacks: dict[str, list[Callable[[dict], None]]] = defaultdict(list)
+        self._queues: dict[str, set[asyncio.Queue]] = defaultdict(set)
+        self._connection: asyncpg.Connection | None = None
+
+    def on(self, channel: str, callback: Callable[[dict], None]) -> None:
+        self._callbacks[channel].append(callback)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        new_channel = channel not in self._callbacks and not self._queues[channel]
+        self._queues[channel].add(queue)
+        if new_channel and self._connection is not None:
+            await self._connection.add_listener(channel, self._dispatch)
+        try:
+            yield queue
+        finally:
+            self._queues[channel].discard(queue)
+
+    def _channels(self) -> set[str]:
+        return set(self._callbacks) | {channel for channel, queues in self._queues.items() if queues}
+
+    def _deliver(self, queue: asyncio.Queue, message: dict) -> None:
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # A slow subscriber gets a reset instead of an unbounded backlog.
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESET)
+
+    def _dispatch(self, connection, pid, channel: str, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed notification on %s: %r", channel, payload)
+            return
+        # Listeners test for a reset with ``message is RESET``.
+        self._broadcast(channel, RESET if message == RESET else message)
+
+    def _broadcast(self, channel: str, message: dict) -> None:
+        for callback in self._callbacks.get(channel, ()):
+            try:
+                callback(message)
+            except Exception:
+                logger.exception("Notification callback failed on %s", channel)
+        for queue in list(self._queues.get(channel, ())):
+            self._deliver(queue, message)
+
+    async def run(self) -> None:
+        # Reconnects for as long as the worker lives, broadcasting a reset
+        # each time, since messages sent while disconnected are lost.
+        url = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            closed = asyncio.Event()
+            try:
+                connection = await asyncpg.connect(url)
+            except Exception:
+                logger.exception("Notification listener cannot connect, retrying in %ss", RECONNECT_SECONDS)
+                await asyncio.sleep(RECONNECT_SECONDS)
+                continue
+            try:
+                connection.add_termination_listener(lambda connection: closed.set())
+                for channel in self._channels():
+                    await connection.add_listener(channel, self._dispatch)
+                self._connection = connection
+                for channel in self._channels():
+                    self._broadcast(channel, RESET)
+                await closed.wait()
+                logger.warning("Notification listener lost its connection, reconnecting")
+            finally:
+                self._connection = None
+                if not connection.is_closed():
+                    await connection.close(timeout=RECONNECT_SECONDS)
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+
+pubsub = PubSub()
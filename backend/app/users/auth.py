@@ -1,10 +1,12 @@
 from datetime import datetime, timedelta
+from uuid import uuid4
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status, Security
 from fastapi.security import OAuth2PasswordBearer, SecurityScopes
 from sqlalchemy.orm import Session
 from . import crud, schemas
-from ..database import get_db
+from .revocation import denylist
+from ..database import get_session
 from ..config import settings
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -18,30 +20,35 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+async def get_token_payload(token: str = Depends(oauth2_scheme)) -> dict:
+    # Revocation is checked against the in-memory denylist, so a valid
+    # token costs no database round trip. Tokens without a jti predate
+    # revocation support and cannot be revoked; they are refused.
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        user = await crud.get_user(db, username=username)
     except JWTError:
         raise credentials_exception
+    if payload.get("sub") is None or payload.get("jti") is None or payload["jti"] in denylist:
+        raise credentials_exception
+    return payload
+
+async def get_current_user(payload: dict = Depends(get_token_payload), db: AsyncSession = Depends(get_session)):
+    user = await crud.get_cached_user(db, username=payload["sub"])
     if user is None:
         raise credentials_exception
     return user
 
-async def get_current_admin(db: AsyncSession = Depends(get_db), token: str = Depends(oauth2_scheme)) -> schemas.User:
-    user = await get_current_user(token=token, db=db)
+async def get_current_admin(user: schemas.User = Depends(get_current_user)) -> schemas.User:
     if not user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
     return user
\ No newline at end of file
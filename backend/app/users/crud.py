@@ -1,69 +1,147 @@
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, or_, update
 from sqlalchemy.future import select
-from passlib.context import CryptContext
 from . import models, schemas
+from .hashing import password_hasher
+from ..cache import TTLCache
+from ..config import settings
+from ..pagination import PageParams, decode_cursor, encode_cursor
+from ..pubsub import RESET, publish, pubsub
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Users resolved from access tokens, keyed by username. Entries are detached
+# ORM objects; every write path below drops the affected user in every
+# worker through USERS_CHANNEL.
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+
+# NOTIFY channel for user changes, so every worker drops the user, not only
+# the one that made the change.
+USERS_CHANNEL = "users"
+
+async def publish_user_change(db: AsyncSession, username: str):
+    await publish(db, USERS_CHANNEL, {"username": username})
+
+def _on_user_change(message: dict):
+    if message is RESET:
+        user_cache.clear()
+    else:
+        user_cache.pop(message["username"])
+
+pubsub.on(USERS_CHANNEL, _on_user_change)
 
 async def get_user(db: AsyncSession, username: str):
-    async with db as session:
-        result = await session.execute(select(models.User).filter(models.User.username == username))
-        return result.scalars().first()
+    result = await db.execute(select(models.User).filter(models.User.username == username))
+    return result.scalars().first()
+
+async def get_cached_user(db: AsyncSession, username: str):
+    user = user_cache.get(username)
+    if user is None:
+        user = await get_user(db, username)
+        if user is not None:
+            # Detached, or a rollback of this request would expire it and
+            # break every later request that reads it from the cache.
+            db.expunge(user)
+            user_cache.set(username, user)
+    return user
 
 async def create_user(db: AsyncSession, user: schemas.UserCreate):
-    fake_hashed_password = pwd_context.hash(user.password)
+    fake_hashed_password = await password_hasher.hash(user.password)
     db_user = models.User(username=user.username, email=user.email, hashed_password=fake_hashed_password)
-    async with db as session:
-        session.add(db_user)
-        await session.commit()
-        await session.refresh(db_user)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 async def authenticate_user(db: AsyncSession, username: str, password: str):
     user = await get_user(db, username)
     if not user:
         return False
-    if not pwd_context.verify(password, user.hashed_password):
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash is not None:
+        user.hashed_password = new_hash
+        db.add(user)
+        await db.commit()
     return user
 
 async def set_user_vip_status(db: AsyncSession, user_id: int, vip_status: bool):
-    async with db.begin():
-        stmt = select(models.User).where(models.User.id == user_id)
-        result = await db.execute(stmt)
-        user = result.scalars().first()
-        if user:
-            user.is_vip = vip_status
-            await db.commit()
-            return user
-    return None
+    stmt = (
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(is_vip=vip_status)
+        .returning(models.User.username, models.User.is_vip)
+        .execution_options(synchronize_session=False)
+    )
+    user = (await db.execute(stmt)).first()
+    if user:
+        await publish_user_change(db, user.username)
+        await db.commit()
+        user_cache.pop(user.username)
+    return user
+
+def like_pattern(q: str) -> str:
+    # Matches q literally anywhere in the value.
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
 
-async def get_users(db: AsyncSession):
-    async with db as session:
-        result = await session.execute(select(models.User))
-        users = result.scalars().all()
-        return users
+async def get_users(db: AsyncSession, page: PageParams, q: str | None = None) -> dict:
+    stmt = (
+        select(
+            models.User.id,
+            models.User.username,
+            models.User.first_name,
+            models.User.last_name,
+            models.User.is_vip,
+        )
+        .order_by(models.User.id)
+        .limit(page.limit + 1)
+    )
+    if q:
+        # Each ILIKE is served by the column's trigram index; Postgres ORs
+        # the bitmaps, so only matching rows are read and sorted.
+        pattern = like_pattern(q)
+        stmt = stmt.filter(or_(
+            models.User.username.ilike(pattern),
+            models.User.first_name.ilike(pattern),
+            models.User.last_name.ilike(pattern),
+        ))
+    if page.cursor is not None:
+        (after_id,) = decode_cursor(page.cursor, int)
+        stmt = stmt.filter(models.User.id > after_id)
+    result = await db.execute(stmt)
+    users = result.all()
+
+    next_cursor = None
+    if len(users) > page.limit:
+        users = users[:page.limit]
+        next_cursor = encode_cursor([users[-1].id])
+    return {"items": users, "next_cursor": next_cursor}
     
 async def update_user(db: AsyncSession, user_id: int, user_update: schemas.UserUpdate):
-    async with db as session:
-        result = await session.execute(select(models.User).filter(models.User.id == user_id))
-        user = result.scalars().first()
-        if user:
-            user_data = user_update.dict(exclude_unset=True)
-            for key, value in user_data.items():
-                setattr(user, key, value)
-            session.add(user)
-            await session.commit()
-            await session.refresh(user)
-            return user
+    result = await db.execute(select(models.User).filter(models.User.id == user_id))
+    user = result.scalars().first()
+    if user:
+        user_data = user_update.model_dump(exclude_unset=True)
+        for key, value in user_data.items():
+            setattr(user, key, value)
+        await publish_user_change(db, user.username)
+        await db.commit()
+        await db.refresh(user)
+        user_cache.pop(user.username)
+        return user
         
 async def delete_user(db: AsyncSession, user_id: int):
-    async with db.begin():
-        stmt = select(models.User).where(models.User.id == user_id)
-        result = await db.execute(stmt)
-        user = result.scalars().first()
-        if user:
-            await db.delete(user)
-            await db.commit()
-            return True
-    return False
\ No newline at end of file
+    # The user's posts go with it through the ON DELETE CASCADE foreign key.
+    stmt = (
+        delete(models.User)
+        .where(models.User.id == user_id)
+        .returning(models.User.username)
+        .execution_options(synchronize_session=False)
+    )
+    username = await db.scalar(stmt)
+    if username is None:
+        return False
+    await publish_user_change(db, username)
+    await db.commit()
+    user_cache.pop(username)
+    return True
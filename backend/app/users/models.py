@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, Boolean
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Index
 
 from ..database import Base
 from sqlalchemy.orm import relationship, Mapped
@@ -16,7 +18,21 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_vip = Column(Boolean, default=False)
     is_admin = Column(Boolean, default=False)  
-    first_name = Column(String, index=True)  
-    last_name = Column(String, index=True)   
+    first_name = Column(String)
+    last_name = Column(String)
     
-    posts: Mapped[list["Post"]] = relationship("Post", back_populates="owner_details")
\ No newline at end of file
+    posts: Mapped[list["Post"]] = relationship("Post", back_populates="owner_details")
+
+
+# Trigram indexes for the user directory's substring search (ILIKE '%q%').
+Index("ix_users_username_trgm", User.username, postgresql_using="gin", postgresql_ops={"username": "gin_trgm_ops"})
+Index("ix_users_first_name_trgm", User.first_name, postgresql_using="gin", postgresql_ops={"first_name": "gin_trgm_ops"})
+Index("ix_users_last_name_trgm", User.last_name, postgresql_using="gin", postgresql_ops={"last_name": "gin_trgm_ops"})
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    jti = Column(String(32), unique=True, index=True, nullable=False)
+    # When the token would have expired anyway; later the row is useless.
+    expires_at = Column(DateTime, index=True, nullable=False)
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False)
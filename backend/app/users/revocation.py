@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import async_session_maker
+from ..pubsub import RESET, publish, pubsub
+from .models import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+REVOCATIONS_CHANNEL = "revoked_tokens"
+
+
+class TokenDenylist:
+    """Revoked token ids (jti) held in memory until the tokens expire.
+
+    Checking a token is a dict lookup. Revocations are never undone, so
+    entries from the database and from notifications are only ever merged
+    in, and pruned once expired.
+    """
+
+    def __init__(self):
+        self._expires_at: dict[str, float] = {}
+        self._prune_at = 1024
+
+    def add(self, jti: str, expires_at: float) -> None:
+        if expires_at > time.time():
+            self._expires_at[jti] = expires_at
+        # Pruning whenever the size doubles keeps adds amortized O(1).
+        if len(self._expires_at) >= self._prune_at:
+            self.prune()
+            self._prune_at = max(2 * len(self._expires_at), 1024)
+
+    def __contains__(self, jti: str) -> bool:
+        return jti in self._expires_at
+
+    def prune(self) -> None:
+        now = time.time()
+        self._expires_at = {jti: exp for jti, exp in self._expires_at.items() if exp > now}
+
+    def __len__(self) -> int:
+        return len(self._expires_at)
+
+
+denylist = TokenDenylist()
+
+
+async def load_denylist() -> None:
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(RevokedToken.jti, RevokedToken.expires_at)
+            .filter(RevokedToken.expires_at > datetime.utcnow())
+        )
+        for jti, expires_at in result:
+            denylist.add(jti, expires_at.replace(tzinfo=timezone.utc).timestamp())
+
+
+async def revoke_token(db: AsyncSession, jti: str, expires_at: float) -> None:
+    # Stored for workers that start later, and announced to running ones.
+    # Expired rows are cleared on the way; logouts are rare enough.
+    await db.execute(
+        insert(RevokedToken)
+        .values(jti=jti, expires_at=datetime.utcfromtimestamp(expires_at), revoked_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+    )
+    await db.execute(delete(RevokedToken).filter(RevokedToken.expires_at <= datetime.utcnow()))
+    await publish(db, REVOCATIONS_CHANNEL, {"jti": jti, "exp": expires_at})
+    await db.commit()
+    denylist.add(jti, expires_at)
+
+
+async def _reload_denylist() -> None:
+    try:
+        await load_denylist()
+    except Exception:
+        logger.exception("Reloading the token denylist failed")
+
+
+_reload_tasks: set[asyncio.Task] = set()
+
+
+def _on_revocation(message: dict) -> None:
+    if message is RESET:
+        # Revocations may have been missed while the listener was away.
+        task = asyncio.get_running_loop().create_task(_reload_denylist())
+        _reload_tasks.add(task)
+        task.add_done_callback(_reload_tasks.discard)
+    else:
+        denylist.add(message["jti"], message["exp"])
+
+
+pubsub.on(REVOCATIONS_CHANNEL, _on_revocation)
@@ -1,30 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
-from . import crud, schemas, auth
-from ..database import get_db  
+from . import crud, schemas, auth, revocation
+from ..database import get_session
 from ..config import settings
+from ..pagination import Page, PageParams, page_params
 from datetime import timedelta
 from typing import List
 router = APIRouter()
 
 @router.post("/users/", response_model=schemas.User)
-async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_session)):
     db_user = await crud.get_user(db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     return await crud.create_user(db=db, user=user)
 
-@router.get("/users/", response_model=List[schemas.User])
-async def read_users(db: AsyncSession = Depends(get_db)):
-    users = await crud.get_users(db)
-    return users
+@router.get("/users/", response_model=Page[schemas.UserSummary])
+async def read_users(
+    # Trigrams need at least three characters to narrow the search.
+    q: str | None = Query(None, min_length=3, max_length=100, description="Part of a username, first or last name"),
+    page: PageParams = Depends(page_params),
+    db: AsyncSession = Depends(get_session),
+):
+    return await crud.get_users(db, page, q=q)
 
 @router.put("/users/{user_id}/update", response_model=schemas.User)
 async def update_user_profile(
     user_id: int,
     user_update: schemas.UserUpdate,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_session),
     current_user: schemas.User = Depends(auth.get_current_user)
 ):
     if current_user.id != user_id and not current_user.is_admin:
@@ -34,10 +39,10 @@ async def update_user_profile(
         raise HTTPException(status_code=404, detail="User not found")
     return updated_user
 
-@router.delete("/users/{user_id}", response_model=schemas.User)
+@router.delete("/users/{user_id}")
 async def delete_user_account(
     user_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_session),
     current_user: schemas.User = Depends(auth.get_current_user)
 ):
     if current_user.id != user_id and not current_user.is_admin:
@@ -50,7 +55,7 @@ async def delete_user_account(
     return {"message": "User successfully deleted"}
 
 @router.post("/login", response_model=schemas.Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_session)):
     user = await crud.authenticate_user(db, username=form_data.username, password=form_data.password)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
@@ -66,7 +71,7 @@ async def read_users_me(current_user: schemas.User = Depends(auth.get_current_us
 async def set_user_vip(
     user_id: int,
     vip_status: bool = Query(..., description="Set VIP status of the user"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_session),
     current_admin: schemas.User = Depends(auth.get_current_admin)) -> dict:
     if not current_admin.is_admin:
         raise HTTPException(
@@ -81,5 +86,9 @@ async def set_user_vip(
 
 
 @router.post("/logout")
-async def logout():
+async def logout(
+    payload: dict = Depends(auth.get_token_payload),
+    db: AsyncSession = Depends(get_session),
+):
+    await revocation.revoke_token(db, jti=payload["jti"], expires_at=payload["exp"])
     return {"message": "User logged out successfully"}
\ No newline at end of file
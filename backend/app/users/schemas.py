@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 from typing import List
 from typing import Optional
 
@@ -20,8 +20,15 @@ class User(UserBase):
     is_vip: bool
     first_name: Optional[str] = None
     last_name: Optional[str] = None 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+class UserSummary(BaseModel):
+    id: int
+    username: str
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    is_vip: bool
+    model_config = ConfigDict(from_attributes=True)
 
 class Token(BaseModel):
     access_token: str
@@ -0,0 +1,217 @@
+"""API benchmark: seeds Postgres and drives the real app in-process.
+
+Run from the backend directory against a throwaway database (the one
+configured in .env is used and, with --reset, truncated):
+
+    python -m benchmarks.run --reset --users 1000 --posts 10000
+    python -m benchmarks.run --update-baseline   # record benchmarks/baseline.json
+
+Each endpoint reports p50/p95/p99 latency, throughput and SQL statements per
+request. The run exits with status 1 when an endpoint's p95 exceeds the
+baseline by more than --tolerance or it issues more SQL statements per
+request than the baseline recorded.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import httpx
+from prometheus_client import REGISTRY
+from sqlalchemy import select
+
+# One client sends every request; per-client rate limits would only
+# measure the limiter. Load shedding stays on.
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from app.database import engine
+from app.main import app
+from app.posts import crud
+from app.posts.models import Post
+from app.users.models import User
+
+from . import seed
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+
+
+class Context:
+    def __init__(self, client: httpx.AsyncClient, rng: random.Random, post_ids: list[int], vip_token: str):
+        self.client = client
+        self.rng = rng
+        self.post_ids = post_ids
+        self.vip_token = vip_token
+
+    def random_day(self) -> str:
+        return (date.today() + timedelta(days=self.rng.randint(-30, 90))).isoformat()
+
+
+def new_post(ctx: Context) -> dict:
+    return {
+        "title": "Benchmark event",
+        "body": seed.random_text(ctx.rng, 40),
+        "image": "",
+        "lat": seed.CENTER_LAT + ctx.rng.uniform(-seed.SPREAD, seed.SPREAD),
+        "lng": seed.CENTER_LNG + ctx.rng.uniform(-seed.SPREAD, seed.SPREAD),
+        "date": ctx.random_day(),
+        "time": "19:00",
+        "is_free": True,
+    }
+
+
+SCENARIOS = {
+    "list": lambda ctx: ctx.client.get("/post/", params={"limit": 50}),
+    "detail": lambda ctx: ctx.client.get(f"/post/{ctx.rng.choice(ctx.post_ids)}/"),
+    "date_filter": lambda ctx: ctx.client.get("/post/", params={"dates": ctx.random_day(), "limit": 50}),
+    "nearby": lambda ctx: ctx.client.get(
+        "/post/nearby/",
+        params={
+            "lat": seed.CENTER_LAT + ctx.rng.uniform(-seed.SPREAD, seed.SPREAD),
+            "lng": seed.CENTER_LNG + ctx.rng.uniform(-seed.SPREAD, seed.SPREAD),
+            "radius_km": 2,
+        },
+    ),
+    "login": lambda ctx: ctx.client.post(
+        "/login",
+        data={"username": f"bench{ctx.rng.randrange(10)}", "password": seed.BENCH_PASSWORD},
+    ),
+    "create": lambda ctx: ctx.client.post(
+        "/post/",
+        json=new_post(ctx),
+        headers={"Authorization": f"Bearer {ctx.vip_token}"},
+    ),
+}
+
+
+def statements_executed() -> float:
+    return REGISTRY.get_sample_value("db_statements_total") or 0.0
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(ctx: Context, name: str, requests: int, concurrency: int, warm: bool) -> dict:
+    scenario = SCENARIOS[name]
+    latencies: list[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            if not warm:
+                crud.invalidate_post_caches()
+            started_at = time.perf_counter()
+            response = await scenario(ctx)
+            latencies.append(time.perf_counter() - started_at)
+            if response.status_code >= 400:
+                errors += 1
+
+    statements_before = statements_executed()
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+    statements = statements_executed() - statements_before
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "rps": round(requests / elapsed, 1),
+        "sql_per_request": round(statements / requests, 2),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result["p95_ms"] > expected["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']}ms > baseline {expected['p95_ms']}ms")
+        if result["sql_per_request"] > expected["sql_per_request"]:
+            regressions.append(
+                f"{name}: {result['sql_per_request']} SQL statements/request "
+                f"> baseline {expected['sql_per_request']}"
+            )
+        if result["errors"] > expected.get("errors", 0):
+            regressions.append(f"{name}: {result['errors']} errors")
+    return regressions
+
+
+def print_table(results: dict) -> None:
+    columns = ["requests", "errors", "p50_ms", "p95_ms", "p99_ms", "rps", "sql_per_request"]
+    print(f"{'endpoint':<12}" + "".join(f"{column:>16}" for column in columns))
+    for name, result in results.items():
+        print(f"{name:<12}" + "".join(f"{result[column]:>16}" for column in columns))
+
+
+async def main(args: argparse.Namespace) -> int:
+    if args.reset:
+        await seed.reset()
+    users, posts = await seed.count_rows()
+    if posts == 0:
+        print(f"Seeding {args.users} users and {args.posts} posts...")
+        await seed.seed(users=args.users, posts=args.posts, seed=args.seed)
+    else:
+        print(f"Using existing data: {users} users, {posts} posts (pass --reset to reseed)")
+
+    async with engine.connect() as connection:
+        post_ids = list(await connection.scalars(select(Post.id)))
+        vip_username = await connection.scalar(select(User.username).filter(User.is_vip).limit(1))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        response = await client.post("/login", data={"username": vip_username, "password": seed.BENCH_PASSWORD})
+        response.raise_for_status()
+        ctx = Context(client, random.Random(args.seed), post_ids, response.json()["access_token"])
+
+        results = {}
+        for name in args.endpoints:
+            await run_scenario(ctx, name, min(args.requests, 10), args.concurrency, args.warm)
+            results[name] = await run_scenario(ctx, name, args.requests, args.concurrency, args.warm)
+    await engine.dispose()
+
+    print_table(results)
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--reset", action="store_true", help="truncate users, posts and categories first")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warm", action="store_true", help="keep the post response caches between requests")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--endpoints", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 slowdown, 0.25 = 25%%")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args(sys.argv[1:]))))
@@ -0,0 +1,97 @@
+import random
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func, select, text
+
+from app.database import engine
+from app.posts.models import Category, Post
+from app.users.hashing import pwd_context
+from app.users.models import User
+
+BENCH_PASSWORD = "bench-password"
+CATEGORIES = ["music", "food", "cinema", "learning", "charity"]
+
+# Around Bishkek, where the map client opens.
+CENTER_LAT, CENTER_LNG = 42.876467, 74.603605
+SPREAD = 0.15
+
+WORDS = (
+    "концерт выставка лекция фестиваль ярмарка турнир мастер-класс "
+    "music food cinema meetup workshop open air party market"
+).split()
+
+
+def random_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+async def reset() -> None:
+    async with engine.begin() as connection:
+        await connection.execute(text("TRUNCATE users, posts, categories RESTART IDENTITY CASCADE"))
+
+
+async def count_rows() -> tuple[int, int]:
+    async with engine.connect() as connection:
+        users = await connection.scalar(select(func.count()).select_from(User))
+        posts = await connection.scalar(select(func.count()).select_from(Post))
+    return users, posts
+
+
+async def seed(users: int, posts: int, seed: int = 0) -> None:
+    # Rows go in with COPY; all users share one password hash so seeding
+    # does not spend minutes in bcrypt.
+    rng = random.Random(seed)
+    hashed_password = pwd_context.hash(BENCH_PASSWORD)
+    now = datetime.utcnow()
+    today = date.today()
+
+    async with engine.begin() as connection:
+        raw_connection = await connection.get_raw_connection()
+        driver = raw_connection.driver_connection
+
+        await driver.copy_records_to_table(
+            Category.__tablename__,
+            records=[(name,) for name in CATEGORIES],
+            columns=["name"],
+        )
+        await driver.copy_records_to_table(
+            User.__tablename__,
+            records=[
+                (
+                    f"bench{i}", f"bench{i}@example.com", hashed_password,
+                    True, i % 10 == 0, i == 0, f"Name{i}", f"Surname{i}",
+                )
+                for i in range(users)
+            ],
+            columns=[
+                "username", "email", "hashed_password", "is_active",
+                "is_vip", "is_admin", "first_name", "last_name",
+            ],
+        )
+        category_ids = list(await connection.scalars(select(Category.id)))
+        user_ids = list(await connection.scalars(select(User.id)))
+        await driver.copy_records_to_table(
+            Post.__tablename__,
+            records=[
+                (
+                    random_text(rng, 3).capitalize()[:100],
+                    random_text(rng, 40),
+                    "",
+                    CENTER_LAT + rng.uniform(-SPREAD, SPREAD),
+                    CENTER_LNG + rng.uniform(-SPREAD, SPREAD),
+                    today + timedelta(days=rng.randint(-30, 90)),
+                    time(rng.randint(8, 23), rng.choice((0, 15, 30, 45))),
+                    rng.random() < 0.5,
+                    rng.choice(category_ids),
+                    rng.choice(user_ids),
+                    now,
+                    now,
+                )
+                for _ in range(posts)
+            ],
+            columns=[
+                "title", "body", "image", "lat", "lng", "date", "time",
+                "is_free", "category_id", "owner", "created_at", "updated_at",
+            ],
+        )
+        await connection.execute(text("ANALYZE users, posts, categories"))
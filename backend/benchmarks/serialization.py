@@ -0,0 +1,99 @@
+"""Serialization benchmark for post listings.
+
+Compares building one large post list page the way listings used to
+(ORM entities, a dict per row, FastAPI response_model validation and
+jsonable_encoder) with the current path (column rows validated once by
+attribute and dumped straight to JSON bytes). Run from the backend
+directory once the benchmark data is seeded:
+
+    python -m benchmarks.serialization --limit 10000
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.future import select
+from sqlalchemy.orm import joinedload
+
+from app.database import async_session_maker, engine
+from app.main import app  # noqa: F401  configures the mappers
+from app.pagination import PageParams
+from app.posts import crud
+from app.posts.models import Post
+from app.posts.routers import post_page_adapter, render_post_page
+
+
+async def entity_page(limit: int) -> bytes:
+    async with async_session_maker() as session:
+        stmt = (
+            select(Post)
+            .options(joinedload(Post.owner_details))
+            .order_by(Post.date, Post.time, Post.id)
+            .limit(limit)
+        )
+        posts = (await session.execute(stmt)).scalars().all()
+        items = [
+            {
+                "id": post.id,
+                "owner": post.owner_details.username,
+                "owner_id": post.owner_details.id,
+                "title": post.title,
+                "body": post.body,
+                "image": post.image,
+                "date": post.date,
+                "time": post.time,
+                "is_free": post.is_free,
+                "lat": post.lat,
+                "lng": post.lng,
+                "category_id": post.category_id,
+            }
+            for post in posts
+        ]
+    page = post_page_adapter.validate_python({"items": items, "next_cursor": None})
+    return json.dumps(jsonable_encoder(page)).encode()
+
+
+async def projected_page(limit: int) -> bytes:
+    async with async_session_maker() as session:
+        posts = await crud.get_posts(session=session, page=PageParams(limit=limit))
+    return render_post_page(posts)
+
+
+async def measure(render, limit: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        await render(limit)
+        best = min(best, time.perf_counter() - started_at)
+    return best
+
+
+async def main(args: argparse.Namespace) -> int:
+    entity_body = await entity_page(args.limit)
+    projected_body = await projected_page(args.limit)
+    if json.loads(entity_body)["items"] != json.loads(projected_body)["items"]:
+        print("The two paths render different items")
+        return 1
+    print(f"{len(json.loads(projected_body)['items'])} posts, {len(projected_body)} bytes")
+
+    entity = await measure(entity_page, args.limit, args.repeat)
+    projected = await measure(projected_page, args.limit, args.repeat)
+    await engine.dispose()
+    print(f"{'ORM entities + dicts':<24}{entity * 1000:>10.1f} ms")
+    print(f"{'column rows':<24}{projected * 1000:>10.1f} ms")
+    print(f"{'speedup':<24}{entity / projected:>10.2f} x")
+    return 0
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=10000, help="posts on the page")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per path; the best is reported")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args(sys.argv[1:]))))
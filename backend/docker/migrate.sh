@@ -0,0 +1,5 @@
+#!/bin/bash
+
+set -e
+
+alembic upgrade head
@@ -0,0 +1,40 @@
+import multiprocessing
+import os
+
+from prometheus_client import multiprocess
+
+from app.config import settings
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Async workers each serve many requests at once, so one per CPU is enough.
+# Each also holds up to DB_POOL_SIZE + DB_MAX_OVERFLOW pooled connections
+# plus one LISTEN connection, and the default is capped so that all of them
+# fit in DB_CONNECTION_BUDGET (Postgres max_connections less some room for
+# migrations and admin sessions).
+connections_per_worker = settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW + 1
+workers = int(os.environ.get(
+    "WEB_CONCURRENCY",
+    max(1, min(multiprocessing.cpu_count(), settings.DB_CONNECTION_BUDGET // connections_per_worker)),
+))
+
+# Addresses whose X-Forwarded-For is trusted as the client address, which
+# rate limits key on; in compose that is the nginx container only.
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1,::1")
+
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("KEEPALIVE", 5))
+
+
+def on_starting(server):
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        for name in os.listdir(metrics_dir):
+            os.remove(os.path.join(metrics_dir, name))
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,34 @@
+"""posts search vector
+
+Revision ID: 35a5f59b79e3
+Revises: 688672d665f2
+Create Date: 2026-10-18 13:27:45.093318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '35a5f59b79e3'
+down_revision: Union[str, None] = '688672d665f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('posts', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('russian', coalesce(title, '') || ' ' || coalesce(body, ''))", persisted=True),
+        nullable=True,
+    ))
+    op.create_index('ix_posts_search_vector', 'posts', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posts_search_vector', table_name='posts')
+    op.drop_column('posts', 'search_vector')
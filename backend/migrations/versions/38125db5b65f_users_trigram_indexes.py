@@ -0,0 +1,37 @@
+"""users trigram indexes
+
+Revision ID: 38125db5b65f
+Revises: c8d3267c11cb
+Create Date: 2026-10-18 17:21:36.905127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '38125db5b65f'
+down_revision: Union[str, None] = 'c8d3267c11cb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # pg_trgm ships with Postgres contrib; creating it needs a superuser or,
+    # since Postgres 13, CREATE on the database (it is a trusted extension).
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.drop_index('ix_users_first_name', table_name='users')
+    op.drop_index('ix_users_last_name', table_name='users')
+    op.create_index('ix_users_username_trgm', 'users', ['username'], unique=False, postgresql_using='gin', postgresql_ops={'username': 'gin_trgm_ops'})
+    op.create_index('ix_users_first_name_trgm', 'users', ['first_name'], unique=False, postgresql_using='gin', postgresql_ops={'first_name': 'gin_trgm_ops'})
+    op.create_index('ix_users_last_name_trgm', 'users', ['last_name'], unique=False, postgresql_using='gin', postgresql_ops={'last_name': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_last_name_trgm', table_name='users', postgresql_using='gin')
+    op.drop_index('ix_users_first_name_trgm', table_name='users', postgresql_using='gin')
+    op.drop_index('ix_users_username_trgm', table_name='users', postgresql_using='gin')
+    op.create_index('ix_users_last_name', 'users', ['last_name'], unique=False)
+    op.create_index('ix_users_first_name', 'users', ['first_name'], unique=False)
@@ -0,0 +1,54 @@
+"""categories
+
+Revision ID: 688672d665f2
+Revises: 83df4c795566
+Create Date: 2026-10-18 12:41:09.518302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '688672d665f2'
+down_revision: Union[str, None] = '83df4c795566'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The categories table and posts.category_id were so far only created by
+    # the autogenerate run in docker/app.sh, so some databases already have
+    # them and some do not.
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('categories'):
+        op.create_table('categories',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_categories_id'), 'categories', ['id'], unique=False)
+        op.create_index(op.f('ix_categories_name'), 'categories', ['name'], unique=True)
+    if 'category_id' not in {column['name'] for column in inspector.get_columns('posts')}:
+        op.add_column('posts', sa.Column('category_id', sa.Integer(), nullable=True))
+    else:
+        # Autogenerate created the foreign key without an ON DELETE action,
+        # which makes deleting a category that has posts fail.
+        for foreign_key in inspector.get_foreign_keys('posts'):
+            if foreign_key['constrained_columns'] == ['category_id']:
+                op.drop_constraint(foreign_key['name'], 'posts', type_='foreignkey')
+    op.create_foreign_key(
+        'posts_category_id_fkey', 'posts', 'categories', ['category_id'], ['id'], ondelete='SET NULL',
+    )
+    op.create_index(
+        'ix_posts_category_id_date_time_id',
+        'posts',
+        ['category_id', 'date', 'time', 'id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posts_category_id_date_time_id', table_name='posts')
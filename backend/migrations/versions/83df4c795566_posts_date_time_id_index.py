@@ -0,0 +1,26 @@
+"""posts date time id index
+
+Revision ID: 83df4c795566
+Revises: c7e0e9db9ad4
+Create Date: 2026-10-18 11:03:52.771940
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '83df4c795566'
+down_revision: Union[str, None] = 'c7e0e9db9ad4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_posts_date_time_id', 'posts', ['date', 'time', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posts_date_time_id', table_name='posts')
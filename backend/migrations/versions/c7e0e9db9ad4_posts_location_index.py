@@ -0,0 +1,32 @@
+"""posts location index
+
+Revision ID: c7e0e9db9ad4
+Revises: 1ae53101b428
+Create Date: 2026-10-18 10:12:31.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7e0e9db9ad4'
+down_revision: Union[str, None] = '1ae53101b428'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_posts_location',
+        'posts',
+        [sa.text('point(lng, lat)')],
+        unique=False,
+        postgresql_using='gist',
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_posts_location', table_name='posts')
@@ -46,22 +46,105 @@ function initMap() {
         console.log(e.lngLat)
         alert('Идентификатор объекта: ' + id);
     });
-    sendRequest('http://34.125.206.123/post/', "GET")
-        .then(posts => {
-            posts.forEach(post => {
-                // Создаем маркер для каждого поста
-                const marker = new mapgl.Marker(map, {
-                    coordinates: [post?.lng, post?.lat], // Предполагается, что у вас есть координаты для каждого поста
-                });
-
-                // Вызов функции для добавления информации о маркере
-                MapInfo(marker, post); // Предполагается, что у вас есть описание для каждого поста
-            });
-        })
-        .catch(error => {
-            console.error('Ошибка при получении данных о постах:', error);
+    let markers = new Map();
+    let liveEvents = null;
+
+    function viewportParams() {
+        const { northEast, southWest } = map.getBounds();
+        return {
+            min_lng: southWest[0],
+            min_lat: southWest[1],
+            max_lng: northEast[0],
+            max_lat: northEast[1],
+        };
+    }
+
+    // Загружаем только посты, попадающие в видимую область карты,
+    // проходя по страницам через next_cursor
+    async function fetchVisiblePosts() {
+        const params = new URLSearchParams({
+            ...viewportParams(),
+            limit: 500,
+            view: 'summary',
         });
-    
+        const posts = [];
+        let cursor = null;
+        do {
+            if (cursor) {
+                params.set('cursor', cursor);
+            }
+            const page = await sendRequest(`http://34.125.206.123/post/?${params}`, "GET");
+            posts.push(...page.items);
+            cursor = page.next_cursor;
+        } while (cursor);
+        return posts;
+    }
+
+    function addMarker(post) {
+        // Создаем маркер для каждого поста
+        const marker = new mapgl.Marker(map, {
+            coordinates: [post?.lng, post?.lat],
+        });
+        // Вызов функции для добавления информации о маркере
+        MapInfo(marker, post);
+        markers.set(post.id, marker);
+    }
+
+    function removeMarker(id) {
+        const marker = markers.get(id);
+        if (marker) {
+            marker.destroy();
+            markers.delete(id);
+        }
+    }
+
+    function isVisible(post) {
+        const bounds = viewportParams();
+        return post.lat >= bounds.min_lat && post.lat <= bounds.max_lat
+            && post.lng >= bounds.min_lng && post.lng <= bounds.max_lng;
+    }
+
+    function loadPosts() {
+        fetchVisiblePosts()
+            .then(posts => {
+                markers.forEach(marker => marker.destroy());
+                markers = new Map();
+                posts.forEach(addMarker);
+            })
+            .catch(error => {
+                console.error('Ошибка при получении данных о постах:', error);
+            });
+    }
+
+    // Новые, изменённые и удалённые посты приходят по SSE,
+    // без повторной загрузки всего списка
+    function subscribeToPosts() {
+        if (liveEvents) {
+            liveEvents.close();
+        }
+        const params = new URLSearchParams(viewportParams());
+        liveEvents = new EventSource(`http://34.125.206.123/post/live/?${params}`);
+        const upsert = event => {
+            const post = JSON.parse(event.data);
+            removeMarker(post.id);
+            if (isVisible(post)) {
+                addMarker(post);
+            }
+        };
+        liveEvents.addEventListener('created', upsert);
+        liveEvents.addEventListener('updated', upsert);
+        liveEvents.addEventListener('deleted', event => removeMarker(JSON.parse(event.data).id));
+        // Сервер мог пропустить события: перезагружаем список
+        liveEvents.addEventListener('reset', loadPosts);
+    }
+
+    function refreshPosts() {
+        loadPosts();
+        subscribeToPosts();
+    }
+    refreshPosts();
+    map.on('moveend', refreshPosts);
+
     // ! Функция для добавления информации о маркере
     function MapInfo(marker, post) {
         const tooltipEl = document.querySelector('#tooltip');
@@ -83,7 +166,7 @@ function initMap() {
         });
         let postOpen = false; // Флаг для отслеживания состояния поста
 
-        marker.on('click', (event) =>{
+        marker.on('click', async (event) =>{
             const offset = 5;
             postInfoEl.style.position = 'absolute'
             postInfoEl.style.top = `${event.point[1] + offset}px`;
@@ -91,11 +174,13 @@ function initMap() {
 
             if (!postOpen) {
                 postInfoEl.style.display = 'block';
-                postImage.src = post?.image;
                 postTitle.innerHTML = post?.title;
-                postDescription.innerHTML = post?.body;
                 postDate.innerHTML = post?.date;
                 postOpen = true; // Устанавливаем флаг в состояние "открыт"
+                // Список приходит в кратком виде, описание и картинку догружаем
+                const details = await sendRequest(`http://34.125.206.123/post/${post.id}/`, "GET");
+                postImage.src = details?.image?.startsWith('/media/') ? `http://34.125.206.123${details.image}` : details?.image;
+                postDescription.innerHTML = details?.body;
             } else {
                 postInfoEl.style.display = 'none';
                 postOpen = false; // Устанавливаем флаг в состояние "закрыт"